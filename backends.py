@@ -0,0 +1,254 @@
+import json
+import os
+import threading
+import time
+
+
+DEFAULT_MODEL = 'gemma3:1b'
+DEFAULT_HOSTS = {
+    'ollama': 'http://localhost:11434',
+    'openai': 'http://localhost:8080'
+}
+
+
+def normalize_host(host):
+    host = host.strip()
+    if '://' not in host:
+        host = f'http://{host}'
+    return host.rstrip('/')
+
+
+def default_host(kind='ollama'):
+    if kind == 'ollama' and os.environ.get('OLLAMA_HOST', '').strip():
+        return normalize_host(os.environ['OLLAMA_HOST'])
+    return DEFAULT_HOSTS[kind]
+
+
+class OllamaBackend:
+    kind = 'ollama'
+
+    def __init__(self, model=DEFAULT_MODEL, host=None, num_ctx=None, options=None):
+        self.model = model
+        self.host = normalize_host(host) if host else default_host(self.kind)
+        self.options = dict(options or {})
+        if num_ctx:
+            self.options['num_ctx'] = num_ctx
+        self._client = None
+        self.lock = threading.Lock()
+
+    @property
+    def client(self):
+        # One client for the life of the backend keeps its HTTP connections
+        # alive between requests instead of reconnecting for every message.
+        with self.lock:
+            if self._client is None:
+                import ollama
+                self._client = ollama.Client(host=self.host)
+            return self._client
+
+    def chat(self, messages, keep_alive=None):
+        return self.client.chat(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            keep_alive=keep_alive,
+            options=self.options or None
+        )
+
+    def warm_up(self, keep_alive=None):
+        response = self.client.generate(model=self.model, prompt='', keep_alive=keep_alive)
+        return (response.get('load_duration') or 0) / 1e9
+
+    def release(self):
+        self.client.generate(model=self.model, prompt='', keep_alive=0)
+
+    def list_models(self, timeout=2):
+        import urllib.request
+        try:
+            with urllib.request.urlopen(f'{self.host}/api/tags', timeout=timeout) as response:
+                data = json.load(response)
+        except (OSError, ValueError):
+            return None
+        return [model['name'] for model in data.get('models', [])]
+
+    def has_model(self, models):
+        return self.model in models or f'{self.model}:latest' in models
+
+    def pull(self, on_progress=None):
+        import urllib.request
+        request = urllib.request.Request(
+            f'{self.host}/api/pull',
+            data=json.dumps({'model': self.model, 'stream': True}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        with urllib.request.urlopen(request) as response:
+            for line in response:
+                if not line.strip():
+                    continue
+                progress = json.loads(line)
+                if 'error' in progress:
+                    raise RuntimeError(progress['error'])
+                if on_progress is not None:
+                    on_progress(progress.get('status', ''), progress.get('completed', 0), progress.get('total', 0))
+
+    def close(self):
+        with self.lock:
+            self._client = None
+
+
+class OpenAICompatibleBackend:
+    kind = 'openai'
+
+    # Ollama option names that have a different name in the OpenAI API.
+    OPTION_NAMES = {'num_predict': 'max_tokens'}
+
+    def __init__(self, model=DEFAULT_MODEL, host=None, num_ctx=None, options=None):
+        self.model = model
+        self.host = normalize_host(host) if host else default_host(self.kind)
+        # The context size is fixed when a server such as llama.cpp starts,
+        # so num_ctx only takes part in cache keys here.
+        self.options = dict(options or {})
+        if num_ctx:
+            self.options['num_ctx'] = num_ctx
+        self._client = None
+        self.lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self.lock:
+            if self._client is None:
+                import httpx
+                self._client = httpx.Client(
+                    base_url=self.host,
+                    timeout=httpx.Timeout(None, connect=5),
+                    limits=httpx.Limits(max_connections=4, max_keepalive_connections=4)
+                )
+            return self._client
+
+    def request_options(self):
+        return {
+            self.OPTION_NAMES.get(name, name): value
+            for name, value in self.options.items() if name != 'num_ctx'
+        }
+
+    def chat(self, messages, keep_alive=None):
+        body = dict(self.request_options(), model=self.model, messages=messages, stream=True)
+        start = time.perf_counter()
+        first_token = None
+        count = 0
+        with self.client.stream('POST', '/v1/chat/completions', json=body) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                choices = json.loads(data).get('choices') or [{}]
+                token = (choices[0].get('delta') or {}).get('content') or ''
+                if token:
+                    count += 1
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                yield {'message': {'content': token}, 'done': False}
+        end = time.perf_counter()
+        first_token = first_token or end
+        # The streaming API reports no timings, so the wait for the first
+        # token stands in for prompt evaluation.
+        yield {
+            'message': {'content': ''},
+            'done': True,
+            'load_duration': 0,
+            'prompt_eval_duration': int((first_token - start) * 1e9),
+            'eval_count': count,
+            'eval_duration': int((end - first_token) * 1e9)
+        }
+
+    def warm_up(self, keep_alive=None):
+        response = self.client.post('/v1/chat/completions', json={
+            'model': self.model,
+            'messages': [{'role': 'user', 'content': 'hi'}],
+            'max_tokens': 1
+        })
+        response.raise_for_status()
+        return 0.0
+
+    def release(self):
+        pass
+
+    def list_models(self, timeout=2):
+        import urllib.request
+        try:
+            with urllib.request.urlopen(f'{self.host}/v1/models', timeout=timeout) as response:
+                data = json.load(response)
+        except (OSError, ValueError):
+            return None
+        return [model['id'] for model in data.get('data', [])]
+
+    def has_model(self, models):
+        # Servers like llama.cpp answer with whatever model they were started
+        # with, whatever name the request uses.
+        return bool(models)
+
+    def pull(self, on_progress=None):
+        raise RuntimeError(f"{self.host} does not support downloading models")
+
+    def close(self):
+        with self.lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+BACKENDS = {
+    'ollama': OllamaBackend,
+    'openai': OpenAICompatibleBackend
+}
+
+_backends = {}
+_config = None
+_lock = threading.Lock()
+
+
+def backend_config(settings):
+    return (
+        settings.get('backend', 'ollama'),
+        settings.get('model', DEFAULT_MODEL),
+        settings.get('large_model') or None,
+        settings.get('host') or None,
+        settings.get('num_ctx') or None,
+        json.dumps(settings.get('model_options', {}), sort_keys=True)
+    )
+
+
+def configure(settings):
+    # The 'small' backend serves every request unless a large_model is set,
+    # in which case code.route_request() may send harder ones to 'large'.
+    global _config
+    config = backend_config(settings)
+    kind, model, large_model, host, num_ctx, options = config
+    if kind not in BACKENDS:
+        print(f"Unknown backend {kind}, using ollama")
+        kind = 'ollama'
+    with _lock:
+        if config == _config:
+            return _backends['small']
+        for backend in _backends.values():
+            backend.close()
+        _backends.clear()
+        _backends['small'] = BACKENDS[kind](model, host, num_ctx, json.loads(options))
+        if large_model and large_model != model:
+            _backends['large'] = BACKENDS[kind](large_model, host, num_ctx, json.loads(options))
+        _config = config
+        return _backends['small']
+
+
+def get_backend(route='small'):
+    with _lock:
+        backend = _backends.get(route) or _backends.get('small')
+    return backend if backend is not None else configure({})
+
+
+def has_route(route):
+    with _lock:
+        return route in _backends
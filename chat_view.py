@@ -0,0 +1,368 @@
+import itertools
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSize
+from PyQt5.QtWidgets import QListView, QStyledItemDelegate, QStyle, QAbstractItemView, QApplication
+from PyQt5.QtGui import QFont, QFontMetrics, QPalette, QKeySequence
+import tracing
+
+
+LabelRole = Qt.UserRole + 1
+RecordRole = Qt.UserRole + 2
+
+ROLE_LABELS = {
+    'user': 'You',
+    'assistant': 'Dave',
+    'repair': 'Fix attempt',
+    'error': 'Error'
+}
+
+
+class ChatModel(QAbstractListModel):
+    def __init__(self, history, translate, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self.translate = translate
+        self.messages = []
+        self.cursor = None
+        # End offset of the last loaded record while an older part of the
+        # history is shown; None when the latest records are loaded.
+        self.newest = None
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.messages)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self.messages[index.row()]
+        if role == Qt.DisplayRole:
+            return message_text(message)
+        if role == LabelRole:
+            return self.label(message)
+        if role == RecordRole:
+            return message
+        return None
+
+    def label(self, message):
+        # Labels are translated when painted, so switching the language only
+        # needs a repaint of the visible rows.
+        label = ROLE_LABELS.get(message['role'])
+        if not label:
+            return None
+        if message.get('attempt'):
+            return f"{self.translate(label)} {message['attempt']}"
+        return self.translate(label)
+
+    def make_message(self, record):
+        return dict(record)
+
+    def has_older(self):
+        return self.cursor is None or self.cursor > 0
+
+    def load_latest(self, limit):
+        return self.load_until(None, limit)
+
+    def load_until(self, end, limit):
+        records, cursor = self.history.load_page(before=end, limit=limit)
+        self.beginResetModel()
+        self.messages = [self.make_message(record) for record in records]
+        self.cursor = cursor
+        self.newest = end if end is not None and end < self.history.size() else None
+        self.endResetModel()
+        return len(records)
+
+    def load_newer(self, limit):
+        if self.newest is None:
+            return 0
+        records = list(itertools.islice(self.history.iter_records(self.newest), limit))
+        self.newest = records[-1]['end'] if len(records) == limit else None
+        if not records:
+            return 0
+        row = len(self.messages)
+        self.beginInsertRows(QModelIndex(), row, row + len(records) - 1)
+        self.messages.extend(self.make_message(record) for record in records)
+        self.endInsertRows()
+        return len(records)
+
+    def load_older(self, limit):
+        if not self.has_older():
+            return 0
+        records, cursor = self.history.load_page(before=self.cursor, limit=limit)
+        self.cursor = cursor
+        if not records:
+            self.cursor = 0
+            return 0
+        self.beginInsertRows(QModelIndex(), 0, len(records) - 1)
+        self.messages[0:0] = [self.make_message(record) for record in records]
+        self.endInsertRows()
+        return len(records)
+
+    def append_message(self, record):
+        row = len(self.messages)
+        message = self.make_message(record)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.messages.append(message)
+        self.endInsertRows()
+        return message
+
+    def row_of(self, message):
+        for row in range(len(self.messages) - 1, -1, -1):
+            if self.messages[row] is message:
+                return row
+        return None
+
+    def row_of_offset(self, offset):
+        for row, message in enumerate(self.messages):
+            if message.get('offset') == offset:
+                return row
+        return None
+
+    def update_message(self, message, **fields):
+        message.update(fields)
+        message.pop('size', None)
+        row = self.row_of(message)
+        if row is None:
+            return None
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+        return index
+
+    def trim_top(self, max_rows):
+        extra = len(self.messages) - max_rows
+        if extra <= 0:
+            return 0
+        offsets = [message.get('offset') for message in self.messages[extra:]]
+        offsets = [offset for offset in offsets if offset is not None]
+        if not offsets:
+            return 0
+        self.beginRemoveRows(QModelIndex(), 0, extra - 1)
+        del self.messages[:extra]
+        self.endRemoveRows()
+        self.cursor = offsets[0]
+        return extra
+
+    def clear(self):
+        self.beginResetModel()
+        self.messages = []
+        self.cursor = 0
+        self.newest = None
+        self.endResetModel()
+
+
+def message_text(message):
+    if message['role'] in ('assistant', 'repair') and message.get('result') is not None:
+        return message['result']
+    return message['content']
+
+
+class MessageDelegate(QStyledItemDelegate):
+    PADDING = 6
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+
+    def text_width(self):
+        return max(50, self.view.viewport().width() - 2 * self.PADDING)
+
+    def sizeHint(self, option, index):
+        message = index.data(RecordRole)
+        width = self.text_width()
+        # Sizes are kept for two widths: the viewport narrows and widens as
+        # the scrollbar comes and goes, e.g. when switching sessions.
+        cached = message.setdefault('size', {})
+        if width in cached:
+            return cached[width]
+
+        height = 2 * self.PADDING
+        label = index.data(LabelRole)
+        if label:
+            bold = QFont(option.font)
+            bold.setBold(True)
+            height += QFontMetrics(bold).height()
+        metrics = QFontMetrics(option.font)
+        text = index.data(Qt.DisplayRole) or ''
+        height += metrics.boundingRect(0, 0, width, 0, Qt.TextWordWrap, text).height()
+        size = QSize(width, height)
+        if len(cached) >= 2:
+            cached.clear()
+        cached[width] = size
+        return size
+
+    def paint(self, painter, option, index):
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.color(QPalette.Highlight))
+            painter.setPen(option.palette.color(QPalette.HighlightedText))
+        else:
+            painter.setPen(option.palette.color(QPalette.Text))
+
+        rect = option.rect.adjusted(self.PADDING, self.PADDING, -self.PADDING, -self.PADDING)
+        label = index.data(LabelRole)
+        if label:
+            bold = QFont(option.font)
+            bold.setBold(True)
+            painter.setFont(bold)
+            painter.drawText(rect, Qt.AlignLeft | Qt.AlignTop, f"{label}:")
+            rect.setTop(rect.top() + QFontMetrics(bold).height())
+        painter.setFont(option.font)
+        painter.drawText(rect, Qt.AlignLeft | Qt.AlignTop | Qt.TextWordWrap, index.data(Qt.DisplayRole) or '')
+        painter.restore()
+
+
+class ChatView(QListView):
+    PAGE_SIZE = 100
+    MAX_ROWS = 500
+
+    def __init__(self, chat_model, parent=None):
+        super().__init__(parent)
+        self.chat_model = chat_model
+        self.delegate = MessageDelegate(self)
+        self.setModel(self.chat_model)
+        self.setItemDelegate(self.delegate)
+        self.setFont(QFont("Segoe UI", 10))
+        self.setMinimumHeight(100)
+        self.setResizeMode(QListView.Adjust)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setWordWrap(True)
+        self.follow_bottom = True
+        self.verticalScrollBar().valueChanged.connect(self.on_scroll)
+
+    def scroll_state(self):
+        return self.follow_bottom, self.verticalScrollBar().value()
+
+    def set_chat_model(self, chat_model, state=None):
+        # Each session keeps the rows it has loaded in its own model, so
+        # switching lays out those rows again without reading its history.
+        scrollbar = self.verticalScrollBar()
+        scrollbar.blockSignals(True)
+        selection = self.selectionModel()
+        self.chat_model = chat_model
+        self.setModel(chat_model)
+        selection.deleteLater()
+        self.doItemsLayout()
+        self.follow_bottom, value = state or (True, 0)
+        if self.follow_bottom:
+            self.scrollToBottom()
+        else:
+            scrollbar.setValue(value)
+        scrollbar.blockSignals(False)
+
+    def is_at_bottom(self):
+        scrollbar = self.verticalScrollBar()
+        if self.chat_model.newest is not None:
+            return False
+        return self.follow_bottom or scrollbar.value() >= scrollbar.maximum() - 2
+
+    def load_latest(self):
+        self.chat_model.load_latest(self.PAGE_SIZE)
+        self.follow_bottom = True
+        self.doItemsLayout()
+        self.scrollToBottom()
+
+    def load_older(self):
+        scrollbar = self.verticalScrollBar()
+        old_maximum = scrollbar.maximum()
+        old_value = scrollbar.value()
+        if not self.chat_model.load_older(self.PAGE_SIZE):
+            return
+        self.doItemsLayout()
+        scrollbar.setValue(scrollbar.maximum() - old_maximum + old_value)
+
+    def load_newer(self):
+        if self.chat_model.load_newer(self.PAGE_SIZE):
+            self.doItemsLayout()
+
+    def show_record(self, offset, end, reload=True):
+        # Scrolls to a record, loading the page that ends with it when it is
+        # not among the loaded rows. Returns False if it could not be shown.
+        row = self.chat_model.row_of_offset(offset)
+        if row is None:
+            if not reload:
+                return False
+            self.chat_model.load_until(end, self.PAGE_SIZE)
+            self.doItemsLayout()
+            row = self.chat_model.row_of_offset(offset)
+            if row is None:
+                return False
+        self.follow_bottom = False
+        index = self.chat_model.index(row)
+        self.scrollTo(index, QAbstractItemView.PositionAtCenter)
+        self.setCurrentIndex(index)
+        return True
+
+    def append_message(self, record):
+        if self.chat_model.newest is not None:
+            self.load_latest()
+        follow = self.is_at_bottom()
+        message = self.chat_model.append_message(record)
+        if follow:
+            self.trim()
+            self.scrollToBottom()
+        return message
+
+    def update_message(self, message, **fields):
+        follow = self.is_at_bottom()
+        index = self.chat_model.update_message(message, **fields)
+        if index is None:
+            return
+        self.delegate.sizeHintChanged.emit(index)
+        if follow:
+            self.doItemsLayout()
+            self.scrollToBottom()
+
+    def trim(self):
+        if self.chat_model.trim_top(self.MAX_ROWS):
+            self.doItemsLayout()
+
+    def retranslate(self):
+        self.viewport().update()
+
+    def clear(self):
+        self.chat_model.clear()
+
+    def on_scroll(self, value):
+        scrollbar = self.verticalScrollBar()
+        self.follow_bottom = value >= scrollbar.maximum() - 2
+        if value == scrollbar.minimum() and scrollbar.maximum() > 0 and self.chat_model.has_older():
+            self.load_older()
+        elif value == scrollbar.maximum() and self.chat_model.newest is not None:
+            self.load_newer()
+
+    def paintEvent(self, event):
+        with tracing.span('ui render'):
+            super().paintEvent(event)
+
+    def resizeEvent(self, event):
+        follow = self.follow_bottom
+        super().resizeEvent(event)
+        if follow:
+            self.doItemsLayout()
+            self.scrollToBottom()
+
+    def wheelEvent(self, event):
+        if event.angleDelta().y() > 0 and self.verticalScrollBar().value() == 0 and self.chat_model.has_older():
+            self.load_older()
+        elif event.angleDelta().y() < 0 and self.is_scrolled_to_end() and self.chat_model.newest is not None:
+            self.load_newer()
+        super().wheelEvent(event)
+
+    def is_scrolled_to_end(self):
+        scrollbar = self.verticalScrollBar()
+        return scrollbar.value() == scrollbar.maximum()
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.Copy):
+            rows = sorted(index.row() for index in self.selectedIndexes())
+            texts = []
+            for row in rows:
+                message = self.chat_model.messages[row]
+                label = self.chat_model.label(message)
+                text = message_text(message)
+                texts.append(f"{label}: {text}" if label else text)
+            QApplication.clipboard().setText('\n'.join(texts))
+            return
+        super().keyPressEvent(event)
@@ -1,24 +1,185 @@
-import ollama
+import backends
 import loader
 import re
 import os
 import sys
 import subprocess
 import tempfile
+import time
+import concurrent.futures
+import threading
+import executor
+import metrics
+import prompts
+import response_cache
+import tracing
+from conversation import Conversation
+
+
+class GenerationCancelled(Exception):
+    pass
+
+
+class CodeBlockParser:
+    # Every fenced block is matched with its own closing fence, whatever its
+    # language, so the closer of a ```bash block is never taken for an
+    # opener; only <python> and python-tagged fences are emitted.
+    OPEN_PATTERN = re.compile(r'<python>|^[ \t]*```[ \t]*([\w+.-]*)[^\n`]*\n', re.MULTILINE)
+    FENCE_CLOSE_PATTERN = re.compile(r'^[ \t]*```', re.MULTILINE)
+    PYTHON_TAGS = ('python', 'python3', 'py', 'py3')
+    LOOKBEHIND = 16
+
+    def __init__(self):
+        self.parse_time = 0.0
+        self.parse_start = None
+        self.buffer = ''
+        self.position = 0
+        self.closing_tag = None
+        self.block_is_python = False
+        self.block_start = 0
+        self.blocks = []
+
+    def feed(self, chunk):
+        # Scans only the text added since the last call (plus a few characters
+        # that may hold a partial tag) and returns the blocks closed by it.
+        start = time.perf_counter()
+        if self.parse_start is None:
+            self.parse_start = start
+        self.buffer += chunk
+        completed = []
+        while True:
+            if self.closing_tag is None:
+                match = self.OPEN_PATTERN.search(self.buffer, self.position)
+                if match is None:
+                    self.position = max(self.position, self.resume_position())
+                    break
+                if match.group() == '<python>':
+                    self.closing_tag = '</python>'
+                    self.block_is_python = True
+                else:
+                    self.closing_tag = '```'
+                    self.block_is_python = match.group(1).lower() in self.PYTHON_TAGS
+                self.block_start = self.position = match.end()
+            elif self.closing_tag == '```':
+                match = self.FENCE_CLOSE_PATTERN.search(self.buffer, self.position)
+                if match is None:
+                    # The closing fence starts a line, so only the last,
+                    # possibly partial, line needs scanning again.
+                    self.position = max(self.block_start, self.buffer.rfind('\n') + 1)
+                    break
+                self.close_block(match.start(), match.end(), completed)
+            else:
+                end = self.buffer.find(self.closing_tag, self.position)
+                if end < 0:
+                    self.position = max(self.block_start, len(self.buffer) - len(self.closing_tag))
+                    break
+                self.close_block(end, end + len(self.closing_tag), completed)
+        self.parse_time += time.perf_counter() - start
+        return completed
+
+    def resume_position(self):
+        # A partial <python> tag fits in the last few characters; a partial
+        # fence opener is the whole last line when it starts with backticks.
+        line_start = self.buffer.rfind('\n') + 1
+        line = self.buffer[line_start:].lstrip(' \t')
+        if line.startswith('```') or '```'.startswith(line):
+            return line_start
+        return len(self.buffer) - self.LOOKBEHIND
+
+    def close_block(self, end, after, completed):
+        if self.block_is_python:
+            self.add_block(self.buffer[self.block_start:end], completed)
+        self.position = after
+        self.closing_tag = None
+
+    def finish(self):
+        completed = []
+        if self.closing_tag == '</python>':
+            self.add_block(self.buffer[self.block_start:], completed)
+            self.closing_tag = None
+        if self.parse_start is not None:
+            tracing.add_span('code extraction', self.parse_start, self.parse_time, blocks=len(self.blocks))
+        return completed
+
+    def add_block(self, block, completed):
+        block = block.strip()
+        if block:
+            self.blocks.append(block)
+            completed.append(block)
+
+
+class BlockRunner:
+    def __init__(self, on_output=None):
+        self.on_output = on_output
+        self.threads = None
+        self.futures = []
+        self.failed = threading.Event()
+
+    def submit(self, block):
+        # Blocks run one after another, in order, while generation continues.
+        if self.threads is None:
+            self.threads = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='block')
+        self.futures.append(self.threads.submit(self.run, block))
+
+    def run(self, block):
+        if self.failed.is_set():
+            return None
+        result = execute_code(block, self.on_output)
+        if result.startswith("Error:"):
+            self.failed.set()
+        return result
+
+    def result(self):
+        results = [future.result() for future in self.futures]
+        self.shutdown()
+        results = [result for result in results if result is not None]
+        if len(results) > 1:
+            results = [result for result in results if result != "Code executed successfully"] or results[:1]
+        return "\n".join(results)
+
+    def cancel(self):
+        self.failed.set()
+        self.shutdown()
+
+    def shutdown(self):
+        if self.threads is not None:
+            self.threads.shutdown(wait=False)
+
+
+def extract_code_blocks(response):
+    parser = CodeBlockParser()
+    parser.feed(response)
+    parser.finish()
+    return parser.blocks
 
 
 def extract_code(response):
-    code_pattern = r'<python>(.*?)</python>'
-    match = re.search(code_pattern, response, re.DOTALL)
-    if match:
-        return match.group(1).strip()
-    return None
+    blocks = extract_code_blocks(response)
+    return blocks[0] if blocks else None
+
 
+def format_execution_result(output, error):
+    output = output.strip()
+    error = error.strip()
+    if error:
+        return f"Error: {error}"
+    return output if output else "Code executed successfully"
 
-def execute_code(code):
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
-        f.write(code)
-        temp_file = f.name
+
+def execute_code(code, on_output=None):
+    try:
+        with tracing.span('execution'):
+            output, error = executor.get_pool().run(code, on_output)
+    except Exception as e:
+        return f"Error: {str(e)}"
+    return format_execution_result(output, error)
+
+
+def execute_code_subprocess(code):
+    with tracing.span('temp-file write'):
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as f:
+            f.write(code)
+            temp_file = f.name
 
     try:
         startupinfo = None
@@ -27,19 +188,16 @@ def execute_code(code):
             startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
             startupinfo.wShowWindow = subprocess.SW_HIDE
 
-        result = subprocess.run(
-            [sys.executable, temp_file],
-            capture_output=True,
-            text=True,
-            startupinfo=startupinfo
-        )
-        
-        output = result.stdout.strip()
-        error = result.stderr.strip()
+        with tracing.span('execution', spawn=True):
+            result = subprocess.run(
+                [sys.executable, temp_file],
+                capture_output=True,
+                text=True,
+                timeout=executor.limits()['timeout'],
+                startupinfo=startupinfo
+            )
         
-        if error:
-            return f"Error: {error}"
-        return output if output else "Code executed successfully"
+        return format_execution_result(result.stdout, result.stderr)
     except Exception as e:
         return f"Error: {str(e)}"
     finally:
@@ -49,88 +207,239 @@ def execute_code(code):
             pass
 
 
-def get_ai_response(user_input, language="en"):
-    agent = '''
-You are Dave, a Windows 10 system assistant. Your responses MUST follow these rules:
+# Word stems (en/ru/de) that hint at a request needing several steps or
+# touching many files, where the small model's code most often fails.
+SEQUENCE_WORDS = re.compile(r'\b(then|after|afterwards|next|finally|потом|затем|после|dann|danach|anschließend)\b', re.IGNORECASE)
+BULK_WORDS = re.compile(r'\b(all|every|each|recursive\w*|subfolders?|все\w*|кажд\w*|alle\w*|jede\w*|rekursiv\w*)\b', re.IGNORECASE)
+FILE_WORDS = re.compile(r'\b(files?|folders?|director\w*|rename|move|copy|delete|zip|archive|файл\w*|папк\w*|переимен\w*|удал\w*|скопир\w*|datei\w*|ordner\w*|verzeichnis\w*|umbenenn\w*|lösch\w*|kopier\w*)\b', re.IGNORECASE)
 
-RESPONSE FORMAT RULES:
-1. EVERY response MUST be wrapped in <python> tags
-2. NEVER use markdown code blocks (```python)
-3. NEVER output code without <python> tags
-4. NEVER output code as plain text
-5. ALWAYS use print() for your response text
 
-CODE RULES:
-1. ALWAYS use absolute paths with os.path.expanduser("~")
-2. ALWAYS use os.path.join() for path construction
-3. ALWAYS verify operations were successful
-4. ALWAYS handle errors gracefully
-5. ALWAYS use proper encoding (utf-8)
+def route_request(user_input):
+    if not backends.has_route('large'):
+        return 'small'
+    score = 0
+    if len(user_input.split()) > 25:
+        score += 1
+    if len(SEQUENCE_WORDS.findall(user_input)) + user_input.count(';') >= 1:
+        score += 1
+    if BULK_WORDS.search(user_input):
+        score += 1
+    if FILE_WORDS.search(user_input):
+        score += 1
+    return 'large' if score >= 2 else 'small'
 
-EXAMPLES:
 
-CORRECT RESPONSE FOR CREATING A FILE:
-<python>
-import os
-desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
-file_path = os.path.join(desktop_path, "God.txt")
-with open(file_path, 'w', encoding='utf-8') as f:
-    pass
-if os.path.exists(file_path):
-    print(f"Файл 'God.txt' успешно создан на рабочем столе!")
-else:
-    print("Ошибка: не удалось создать файл")
-</python>
+def record_route(route, success, latency, fallback=False):
+    metrics.record('route', route=route, model=backends.get_backend(route).model,
+                   success=success, latency=latency, fallback=fallback)
 
-CORRECT RESPONSE FOR SIMPLE MESSAGE:
-<python>
-print("Привет! Я Dave, ваш помощник. Чем могу помочь?")
-</python>
 
-INCORRECT RESPONSES (NEVER DO THIS):
+def route_stats():
+    stats = {}
+    for event in metrics.events('route'):
+        route = stats.setdefault(event['route'], {'count': 0, 'successes': 0, 'latency': 0.0})
+        route['count'] += 1
+        route['successes'] += event['success']
+        route['latency'] += event['latency']
+    return {
+        name: {
+            'count': route['count'],
+            'success_rate': route['successes'] / route['count'],
+            'average_latency': route['latency'] / route['count']
+        }
+        for name, route in stats.items()
+    }
 
-WRONG - Using markdown:
-```python
-print("Hello")
-```
 
-WRONG - No python tags:
-import os
-print("Hello")
+def stream_ai_response(user_input, language="en", on_token=None, cancel_event=None, conversation=None, keep_alive=None, cache=None,
+                       on_output=None, on_attempt=None, repair_attempts=2, repair_budget=60.0):
+    user_content = prompts.user_message(user_input, language)
+    route = route_request(user_input)
 
-WRONG - Plain text:
-Hello, how can I help you?
+    context = None
+    if cache is not None:
+        context = conversation.build_messages('', user_content)[1:-1] if conversation is not None else None
+        cached = cache.get(make_cache_key(user_input, language, route, context))
+        if cached is not None:
+            content = cached['content']
+            if on_token is not None:
+                on_token(content)
+            if cached['code'] and cached['side_effects']:
+                result = execute_code(cached['code'], on_output)
+            else:
+                result = cached['result']
+            if conversation is not None:
+                conversation.add_turn(user_content, content, result if cached['code'] else None)
+            return content, result
 
-WRONG - Current behavior (NEVER do this):
-import os
-desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
-file_path = os.path.join(desktop_path, "God.txt")
-with open(file_path, 'w', encoding='utf-8') as f:
-    pass
-print("File created!")
-
-FINAL CHECKLIST:
-Before sending any response, verify that:
-1. Response is wrapped in <python> tags
-2. All code follows the code rules
-3. All text is output using print()
-4. No markdown code blocks are used
-5. No plain text is output
-'''
-
-    response = ollama.chat(
-        model='gemma3:1b',
-        messages=[
-            {"role": "system", "content": agent},
-            {"role": "user", "content": f"{user_input} (language: {language})"}
-        ]
+    began = start = time.perf_counter()
+    fallback = False
+    streamed = []
+
+    def on_routed_token(token):
+        if not streamed:
+            streamed.append(True)
+        on_token(token)
+
+    try:
+        content, code, result, failed = run_attempt(
+            user_content, language, route, on_routed_token if on_token is not None else None, cancel_event,
+            conversation, keep_alive, on_output
+        )
+    except GenerationCancelled:
+        raise
+    except Exception:
+        if route != 'large':
+            raise
+        # The large backend is down or lacks its model; the small one
+        # answers rather than the request failing, set apart from whatever
+        # the large one streamed before it failed.
+        record_route(route, False, time.perf_counter() - start)
+        route = 'small'
+        fallback = True
+        if streamed:
+            on_token("\n\n")
+        start = time.perf_counter()
+        content, code, result, failed = run_attempt(user_content, language, route, on_token, cancel_event, conversation, keep_alive, on_output)
+    record_route(route, not failed, time.perf_counter() - start, fallback=fallback)
+    if failed and not fallback and route == 'small' and backends.has_route('large'):
+        # The small model's code failed; let the larger one try the same turn.
+        if on_token is not None:
+            on_token("\n\n")
+        start = time.perf_counter()
+        try:
+            retry = run_attempt(user_content, language, 'large', on_token, cancel_event, conversation, keep_alive, on_output)
+        except GenerationCancelled:
+            raise
+        except Exception:
+            # The small model's failed answer stands and gets repaired below.
+            record_route('large', False, time.perf_counter() - start, fallback=True)
+        else:
+            route = 'large'
+            content, code, result, failed = retry
+            record_route(route, not failed, time.perf_counter() - start, fallback=True)
+
+    # Each repair is a follow-up turn after the failed one, so the prompt
+    # up to that turn is unchanged and the backend can reuse its evaluation.
+    if conversation is None:
+        conversation = Conversation()
+    attempt = 0
+    while failed and attempt < repair_attempts and time.perf_counter() - began < repair_budget:
+        attempt += 1
+        metrics.increment('repair_attempt')
+        if on_attempt is not None:
+            on_attempt(attempt, content, result)
+        conversation.add_turn(user_content, content)
+        user_content = prompts.repair_message(result, language)
+        content, code, result, failed = run_attempt(user_content, language, route, on_token, cancel_event, conversation, keep_alive, on_output)
+    if attempt:
+        metrics.record('repair', attempts=attempt, success=not failed, total=time.perf_counter() - began)
+        if not failed:
+            metrics.increment('repair_success')
+
+    if cache is not None and not failed:
+        # Stored under the model that gave the answer, which is not the
+        # routed one after a fallback.
+        cache.put(make_cache_key(user_input, language, route, context), content, code, result)
+    if conversation is not None:
+        conversation.add_turn(user_content, content, result if code else None)
+    return content, result
+
+
+def make_cache_key(user_input, language, route, context=None):
+    backend = backends.get_backend(route)
+    return response_cache.make_key(
+        user_input, language, backend.model, prompts.PROMPT_VERSION, backend.options, context
     )
-    
-    content = response['message']['content']
-    code = extract_code(content)
-    
+
+
+def run_attempt(user_content, language, route, on_token=None, cancel_event=None, conversation=None, keep_alive=None, on_output=None):
+    parser = CodeBlockParser()
+    runner = BlockRunner(on_output)
+
+    def on_chunk(token):
+        for block in parser.feed(token):
+            runner.submit(block)
+        if on_token is not None:
+            on_token(token)
+
+    try:
+        content = generate(user_content, language, on_chunk, cancel_event, conversation, keep_alive, route)
+    except BaseException:
+        runner.cancel()
+        raise
+    for block in parser.finish():
+        runner.submit(block)
+
+    # A failed block is known from the runner rather than from the joined
+    # result, which starts with the output of any block that ran before it.
+    code = '\n\n'.join(parser.blocks) or None
     if code:
-        result = execute_code(code)
-        return result
+        result = runner.result()
+        failed = runner.failed.is_set()
     else:
-        return content
\ No newline at end of file
+        result = content
+        failed = False
+    return content, code, result, failed
+
+
+def generate(user_content, language, on_token=None, cancel_event=None, conversation=None, keep_alive=None, route='small'):
+    backend = backends.get_backend(route)
+    with tracing.span('prompt build'):
+        system_prompt = prompts.system_prompt(language, backend.model)
+
+        if conversation is not None:
+            messages = conversation.build_messages(system_prompt, user_content)
+        else:
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content}
+            ]
+
+    start = time.perf_counter()
+    stream = backend.chat(messages, keep_alive)
+
+    parts = []
+    first_token = None
+    try:
+        for chunk in stream:
+            if cancel_event is not None and cancel_event.is_set():
+                raise GenerationCancelled()
+            token = chunk['message']['content']
+            if token:
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                    tracing.add_span('first token', start, first_token)
+                parts.append(token)
+                if on_token is not None:
+                    on_token(token)
+            if chunk.get('done'):
+                load = (chunk.get('load_duration') or 0) / 1e9
+                prompt_eval_count = chunk.get('prompt_eval_count') or 0
+                prompt_eval = (chunk.get('prompt_eval_duration') or 0) / 1e9
+                eval_count = chunk.get('eval_count') or 0
+                eval_time = (chunk.get('eval_duration') or 0) / 1e9
+                # Ollama reports these phases as durations only; lay them out
+                # back to back from the start of the request.
+                tracing.add_span('ollama load', start, load)
+                tracing.add_span('prompt eval', start + load, prompt_eval, tokens=prompt_eval_count)
+                tracing.add_span('token generation', start + load + prompt_eval, eval_time, tokens=eval_count)
+                metrics.record(
+                    'generation',
+                    load=load,
+                    first_token=first_token,
+                    prompt_eval_count=prompt_eval_count,
+                    prompt_eval=prompt_eval,
+                    total=time.perf_counter() - start
+                )
+    finally:
+        close = getattr(stream, 'close', None)
+        if close is not None:
+            close()
+
+    return ''.join(parts)
+
+
+def get_ai_response(user_input, language="en", conversation=None, keep_alive=None, cache=None):
+    content, result = stream_ai_response(user_input, language, conversation=conversation, keep_alive=keep_alive, cache=cache)
+    return result
\ No newline at end of file
@@ -0,0 +1,82 @@
+import threading
+
+
+class Conversation:
+    def __init__(self, token_budget=2048, strategy="truncate", chars_per_token=4, trim_ratio=0.75):
+        self.token_budget = token_budget
+        self.strategy = strategy
+        self.chars_per_token = chars_per_token
+        self.trim_ratio = trim_ratio
+        self.messages = []
+        self.start = 0
+        self.summary = None
+        self.lock = threading.Lock()
+
+    def estimate_tokens(self, message):
+        return len(message['content']) // self.chars_per_token + 4
+
+    def add_turn(self, user_content, assistant_content, result=None):
+        with self.lock:
+            self.messages.append({"role": "user", "content": user_content, "kind": "input"})
+            self.messages.append({"role": "assistant", "content": assistant_content, "kind": "response"})
+            if result is not None:
+                self.messages.append({"role": "user", "content": f"Execution result:\n{result}", "kind": "result"})
+            self.trim()
+
+    def trim(self):
+        window = self.messages[self.start:]
+        total = sum(self.estimate_tokens(message) for message in window)
+        if self.summary is not None:
+            total += self.estimate_tokens(self.summary)
+        if total <= self.token_budget:
+            return
+
+        # Drop well below the budget at once so the window prefix stays
+        # identical for several turns and Ollama can keep reusing its cache.
+        target = int(self.token_budget * self.trim_ratio)
+        dropped = []
+        while self.start < len(self.messages) and total > target:
+            message = self.messages[self.start]
+            total -= self.estimate_tokens(message)
+            dropped.append(message)
+            self.start += 1
+        while self.start < len(self.messages) and self.messages[self.start]['kind'] != "input":
+            dropped.append(self.messages[self.start])
+            self.start += 1
+
+        if self.strategy == "summarize":
+            self.summarize(dropped)
+
+    def summarize(self, dropped):
+        lines = [] if self.summary is None else self.summary['content'].splitlines()[1:]
+        for message in dropped:
+            if message['kind'] == "response":
+                continue
+            text = message['content'].strip().splitlines()
+            text = text[-1] if message['kind'] == "result" and text else (text[0] if text else "")
+            prefix = "User" if message['kind'] == "input" else "Result"
+            lines.append(f"- {prefix}: {text[:80]}")
+        budget = self.token_budget // 4 * self.chars_per_token
+        while lines and sum(len(line) + 1 for line in lines) > budget:
+            lines.pop(0)
+        self.summary = {
+            "role": "system",
+            "content": "Earlier in this conversation:\n" + "\n".join(lines),
+            "kind": "summary"
+        }
+
+    def build_messages(self, system_prompt, user_content):
+        with self.lock:
+            messages = [{"role": "system", "content": system_prompt}]
+            if self.summary is not None:
+                messages.append({"role": self.summary['role'], "content": self.summary['content']})
+            for message in self.messages[self.start:]:
+                messages.append({"role": message['role'], "content": message['content']})
+            messages.append({"role": "user", "content": user_content})
+            return messages
+
+    def clear(self):
+        with self.lock:
+            self.messages = []
+            self.start = 0
+            self.summary = None
@@ -0,0 +1,618 @@
+import atexit
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import metrics
+import tracing
+
+
+# On POSIX the worker caps itself with rlimits; on Windows the parent puts
+# each worker in a Job Object instead, where the CPU cap counts user time
+# only and ends the worker rather than raising inside the snippet.
+# memory_mb caps address space added by the code, not memory in use: each
+# thread it starts reserves its stack and a malloc arena out of it.
+DEFAULT_LIMITS = {
+    'timeout': 30,
+    'cpu_seconds': 20,
+    'memory_mb': 1024,
+    'max_output': 20000
+}
+
+
+WORKER_SOURCE = r'''
+import builtins
+import codecs
+import io
+import json
+import linecache
+import os
+import signal
+import sys
+import threading
+import traceback
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import datetime
+import glob
+import pathlib
+import platform
+import re
+import shutil
+import subprocess
+import time
+
+proto_in = os.fdopen(os.dup(0), 'r', encoding='utf-8')
+proto_out = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+send_lock = threading.Lock()
+devnull = os.open(os.devnull, os.O_RDWR)
+for fd in (0, 1, 2):
+    os.dup2(devnull, fd)
+# Like python -u: every write goes straight to fds 1 and 2, which a run
+# points at pipes, so prints and the output of processes the code starts
+# are captured the same way.
+sys.stdout = io.TextIOWrapper(io.FileIO(1, 'w', closefd=False), encoding='utf-8', errors='replace', write_through=True)
+sys.stderr = io.TextIOWrapper(io.FileIO(2, 'w', closefd=False), encoding='utf-8', errors='replace', write_through=True)
+
+
+class CPULimitExceeded(Exception):
+    pass
+
+
+def send(message):
+    with send_lock:
+        proto_out.write(json.dumps(message) + '\n')
+        proto_out.flush()
+
+
+class CappedOutput(io.TextIOBase):
+    def __init__(self, limit, stream=None):
+        self.limit = limit
+        self.stream = stream
+        self.parts = []
+        self.pending = []
+        self.size = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.flusher = None
+        if stream is not None:
+            self.wake = threading.Event()
+            self.done = threading.Event()
+            self.flusher = threading.Thread(target=self.run_flusher, daemon=True)
+            self.flusher.start()
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        with self.lock:
+            room = max(0, self.limit - self.size)
+            if room:
+                part = text[:room]
+                self.parts.append(part)
+                self.size += len(part)
+                if self.stream is not None:
+                    self.pending.append(part)
+                    self.wake.set()
+            self.dropped += max(0, len(text) - room)
+        return len(text)
+
+    def run_flusher(self):
+        # Text is forwarded at most 50 ms after it was written, with or
+        # without a newline, and whatever a chatty script writes in that
+        # time goes out as one message rather than one per print.
+        while True:
+            self.wake.wait()
+            if self.done.wait(0.05):
+                break
+            with self.lock:
+                self.wake.clear()
+                self.send_pending()
+
+    def flush(self):
+        with self.lock:
+            self.send_pending()
+
+    def finish(self):
+        # Called before the result is sent, so no output arrives after it.
+        if self.flusher is not None:
+            self.done.set()
+            self.wake.set()
+            self.flusher.join()
+        self.flush()
+
+    def send_pending(self):
+        if self.pending:
+            send({'stream': self.stream, 'text': ''.join(self.pending)})
+            self.pending = []
+
+    def getvalue(self):
+        return ''.join(self.parts)
+
+
+class Capture:
+    # A pipe standing in for fd 1 or 2 during one run, drained into the
+    # run's capped output by a thread.
+    def __init__(self, fd, output):
+        self.fd = fd
+        self.output = output
+        self.read_fd, write_fd = os.pipe()
+        os.dup2(write_fd, fd)
+        os.close(write_fd)
+        self.thread = threading.Thread(target=self.drain, daemon=True)
+        self.thread.start()
+
+    def drain(self):
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        try:
+            while True:
+                data = os.read(self.read_fd, 65536)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                output = self.output
+                if text and output is not None:
+                    output.write(text)
+        except OSError:
+            pass
+        finally:
+            os.close(self.read_fd)
+
+    def close(self):
+        os.dup2(devnull, self.fd)
+        self.thread.join(0.2)
+        # A process the code left running can keep the pipe open; what it
+        # writes later is dropped rather than mixed into another run.
+        self.output = None
+
+
+def on_cpu_limit(signum, frame):
+    raise CPULimitExceeded("CPU time limit exceeded")
+
+
+def set_soft_limit(kind, value):
+    soft, hard = resource.getrlimit(kind)
+    if value is None or value < 0:
+        value = hard
+    elif hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    resource.setrlimit(kind, (value, hard))
+
+
+def address_space():
+    # Linux only; elsewhere the memory cap counts from zero.
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError):
+        return 0
+
+
+def apply_limits(limits):
+    # CPU time and address space are limited relative to what the process
+    # already uses, so the code gets the whole allowance on top of the
+    # interpreter and its pre-imported modules.
+    if resource is None:
+        return
+    cpu = limits.get('cpu_seconds')
+    memory = limits.get('memory_mb')
+    if cpu:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        set_soft_limit(resource.RLIMIT_CPU, int(usage.ru_utime + usage.ru_stime + cpu) + 1)
+    if memory:
+        try:
+            set_soft_limit(resource.RLIMIT_AS, address_space() + memory * 1024 * 1024)
+        except ValueError:
+            pass
+
+
+if hasattr(signal, 'SIGXCPU'):
+    signal.signal(signal.SIGXCPU, on_cpu_limit)
+
+home_stderr = sys.stderr
+# Tracebacks read the code from linecache under this name, so nothing is
+# written to disk.
+SNIPPET_NAME = '<snippet>'
+
+
+def run(request):
+    limits = request.get('limits', {})
+    max_output = limits.get('max_output') or sys.maxsize
+    streaming = request.get('stream', False)
+    stdout = CappedOutput(max_output, 'stdout' if streaming else None)
+    stderr = CappedOutput(max_output, 'stderr' if streaming else None)
+    code = request['code']
+    linecache.cache[SNIPPET_NAME] = (len(code), None, code.splitlines(True), SNIPPET_NAME)
+    namespace = {'__name__': '__main__', '__file__': SNIPPET_NAME, '__builtins__': builtins}
+    sys.stdin = io.StringIO()
+    captures = [Capture(1, stdout), Capture(2, stderr)]
+    limit = None
+    try:
+        apply_limits(limits)
+        exec(compile(code, SNIPPET_NAME, 'exec'), namespace)
+    except SystemExit:
+        pass
+    except BaseException:
+        etype, value, tb = sys.exc_info()
+        if isinstance(value, CPULimitExceeded):
+            limit = 'cpu'
+            tb = None
+        elif isinstance(value, MemoryError):
+            limit = 'memory'
+        traceback.print_exception(etype, value, tb and tb.tb_next, file=home_stderr)
+    for capture in captures:
+        capture.close()
+    stdout.finish()
+    stderr.finish()
+    send({
+        'stdout': stdout.getvalue(),
+        'stderr': stderr.getvalue(),
+        'truncated': stdout.dropped + stderr.dropped,
+        'limit': limit
+    })
+
+
+def run_forked(request):
+    # Each run is a fork of this warmed-up process, so whatever the code
+    # patches, imports or changes dies with it. The pipe tells whether the
+    # run got as far as sending its result.
+    done_read, done_write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(done_read)
+        try:
+            run(request)
+            os.write(done_write, b'1')
+        finally:
+            os._exit(0)
+    os.close(done_write)
+    _, status = os.waitpid(pid, 0)
+    done = os.read(done_read, 1)
+    os.close(done_read)
+    if not done:
+        if os.WIFSIGNALED(status):
+            reason = f"killed by signal {os.WTERMSIG(status)}"
+        else:
+            reason = f"exited with code {os.WEXITSTATUS(status)}"
+        send({'stdout': '', 'stderr': f"Process {reason}\n", 'truncated': 0, 'limit': None})
+
+
+send({'ready': True})
+
+for line in proto_in:
+    request = json.loads(line)
+    if hasattr(os, 'fork'):
+        run_forked(request)
+    else:
+        # Without fork the pool gives each worker a single run instead.
+        run(request)
+'''
+
+
+if sys.platform == 'win32':
+    import ctypes
+    from ctypes import wintypes
+
+    class IO_COUNTERS(ctypes.Structure):
+        _fields_ = [(name, ctypes.c_ulonglong) for name in (
+            'ReadOperationCount', 'WriteOperationCount', 'OtherOperationCount',
+            'ReadTransferCount', 'WriteTransferCount', 'OtherTransferCount'
+        )]
+
+    class JOBOBJECT_BASIC_LIMIT_INFORMATION(ctypes.Structure):
+        _fields_ = [
+            ('PerProcessUserTimeLimit', ctypes.c_longlong),
+            ('PerJobUserTimeLimit', ctypes.c_longlong),
+            ('LimitFlags', wintypes.DWORD),
+            ('MinimumWorkingSetSize', ctypes.c_size_t),
+            ('MaximumWorkingSetSize', ctypes.c_size_t),
+            ('ActiveProcessLimit', wintypes.DWORD),
+            ('Affinity', ctypes.c_size_t),
+            ('PriorityClass', wintypes.DWORD),
+            ('SchedulingClass', wintypes.DWORD)
+        ]
+
+    class JOBOBJECT_EXTENDED_LIMIT_INFORMATION(ctypes.Structure):
+        _fields_ = [
+            ('BasicLimitInformation', JOBOBJECT_BASIC_LIMIT_INFORMATION),
+            ('IoInfo', IO_COUNTERS),
+            ('ProcessMemoryLimit', ctypes.c_size_t),
+            ('JobMemoryLimit', ctypes.c_size_t),
+            ('PeakProcessMemoryUsed', ctypes.c_size_t),
+            ('PeakJobMemoryUsed', ctypes.c_size_t)
+        ]
+
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.CreateJobObjectW.restype = wintypes.HANDLE
+    kernel32.CreateJobObjectW.argtypes = (wintypes.LPVOID, wintypes.LPCWSTR)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    kernel32.AssignProcessToJobObject.argtypes = (wintypes.HANDLE, wintypes.HANDLE)
+    kernel32.SetInformationJobObject.argtypes = (wintypes.HANDLE, ctypes.c_int, wintypes.LPVOID, wintypes.DWORD)
+    kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+
+
+class JobObject:
+    # Windows has no rlimits, so the worker and everything it starts run in
+    # a job whose limits are set before each run and lifted after it.
+    EXTENDED_LIMIT_INFORMATION = 9
+    LIMIT_JOB_TIME = 0x4
+    LIMIT_PROCESS_MEMORY = 0x100
+    LIMIT_KILL_ON_JOB_CLOSE = 0x2000
+    PROCESS_SET_QUOTA = 0x100
+    PROCESS_TERMINATE = 0x1
+    # The exit code of processes ended by the job's CPU time limit.
+    ERROR_NOT_ENOUGH_QUOTA = 1816
+
+    def __init__(self, pid):
+        self.handle = kernel32.CreateJobObjectW(None, None)
+        if not self.handle:
+            raise ctypes.WinError(ctypes.get_last_error())
+        process = kernel32.OpenProcess(self.PROCESS_SET_QUOTA | self.PROCESS_TERMINATE, False, pid)
+        try:
+            if not process or not kernel32.AssignProcessToJobObject(self.handle, process):
+                raise ctypes.WinError(ctypes.get_last_error())
+            self.set_limits()
+        except OSError:
+            self.close()
+            raise
+        finally:
+            if process:
+                kernel32.CloseHandle(process)
+
+    def set_limits(self, cpu_seconds=None, memory_mb=None):
+        info = JOBOBJECT_EXTENDED_LIMIT_INFORMATION()
+        flags = self.LIMIT_KILL_ON_JOB_CLOSE
+        if cpu_seconds:
+            # The job adds the time its processes have already used, so the
+            # limit is relative to this run as with RLIMIT_CPU.
+            flags |= self.LIMIT_JOB_TIME
+            info.BasicLimitInformation.PerJobUserTimeLimit = int(cpu_seconds * 10 ** 7)
+        if memory_mb:
+            flags |= self.LIMIT_PROCESS_MEMORY
+            info.ProcessMemoryLimit = memory_mb * 1024 * 1024
+        info.BasicLimitInformation.LimitFlags = flags
+        if not kernel32.SetInformationJobObject(
+            self.handle, self.EXTENDED_LIMIT_INFORMATION, ctypes.byref(info), ctypes.sizeof(info)
+        ):
+            raise ctypes.WinError(ctypes.get_last_error())
+
+    def close(self):
+        if self.handle:
+            kernel32.CloseHandle(self.handle)
+            self.handle = None
+
+
+class WorkerCrashed(Exception):
+    pass
+
+
+class ExecutionTimeout(WorkerCrashed):
+    pass
+
+
+class Worker:
+    def __init__(self):
+        startupinfo = None
+        options = {}
+        if sys.platform == 'win32':
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            startupinfo.wShowWindow = subprocess.SW_HIDE
+            options['creationflags'] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            # Its own process group, so a timeout also kills anything the
+            # generated code started.
+            options['start_new_session'] = True
+
+        with tracing.span('subprocess spawn'):
+            self.process = subprocess.Popen(
+                [sys.executable, '-u', '-c', WORKER_SOURCE],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                encoding='utf-8',
+                startupinfo=startupinfo,
+                **options
+            )
+        self.job = None
+        if sys.platform == 'win32':
+            try:
+                self.job = JobObject(self.process.pid)
+            except OSError as e:
+                print(f"Error limiting executor worker: {e}")
+        self.runs = 0
+        self.ready = False
+        self.timed_out = False
+
+    def read_message(self):
+        line = self.process.stdout.readline()
+        if not line:
+            self.process.wait()
+            raise WorkerCrashed(f"worker process exited unexpectedly (code {self.process.returncode})")
+        return json.loads(line)
+
+    def wait_ready(self):
+        if not self.ready:
+            self.read_message()
+            self.ready = True
+
+    def run(self, code, limits=None, on_output=None):
+        limits = limits or {}
+        self.wait_ready()
+        request = {'code': code, 'limits': limits, 'stream': on_output is not None}
+        if self.job is not None:
+            try:
+                self.job.set_limits(limits.get('cpu_seconds'), limits.get('memory_mb'))
+            except OSError as e:
+                print(f"Error limiting executor worker: {e}")
+        try:
+            self.process.stdin.write(json.dumps(request) + '\n')
+            self.process.stdin.flush()
+        except OSError:
+            self.process.wait()
+            raise WorkerCrashed(f"worker process exited unexpectedly (code {self.process.returncode})")
+
+        timer = None
+        if limits.get('timeout'):
+            timer = threading.Timer(limits['timeout'], self.expire)
+            timer.daemon = True
+            timer.start()
+        try:
+            result = self.read_message()
+            while 'stream' in result:
+                on_output(result['stream'], result['text'])
+                result = self.read_message()
+        except WorkerCrashed:
+            if self.timed_out:
+                raise ExecutionTimeout(f"execution timed out after {limits['timeout']} seconds")
+            if self.job is not None and self.process.returncode == JobObject.ERROR_NOT_ENOUGH_QUOTA:
+                # The job ended the worker, so the output it held is lost.
+                return {
+                    'stdout': '',
+                    'stderr': 'CPULimitExceeded: CPU time limit exceeded\n',
+                    'truncated': 0,
+                    'limit': 'cpu'
+                }
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+        if self.job is not None:
+            try:
+                self.job.set_limits()
+            except OSError:
+                pass
+        self.runs += 1
+        return result
+
+    def expire(self):
+        self.timed_out = True
+        self.kill()
+
+    def kill(self):
+        if not self.alive():
+            return
+        try:
+            if sys.platform == 'win32':
+                subprocess.run(
+                    ['taskkill', '/F', '/T', '/PID', str(self.process.pid)],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL
+                )
+            else:
+                os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self.process.kill()
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def stop(self):
+        if self.alive():
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=1)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        if self.job is not None:
+            # Closing the job also ends anything the snippets left running.
+            self.job.close()
+
+
+class ExecutorPool:
+    def __init__(self, size=2, max_runs=50, limits=None):
+        self.size = size
+        # Workers fork a fresh process for every run where they can; where
+        # they cannot, a worker serves one run so none sees another's state.
+        self.max_runs = max_runs if hasattr(os, 'fork') else 1
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self.idle = queue.Queue()
+        self.closed = False
+        for _ in range(size):
+            self.idle.put(Worker())
+
+    def spawn(self):
+        try:
+            return Worker()
+        except OSError as e:
+            print(f"Error starting executor worker: {e}")
+            return None
+
+    def run(self, code, on_output=None):
+        if self.closed:
+            raise RuntimeError("executor pool is shut down")
+
+        # A slot whose worker could not be started holds None and tries
+        # again here, so a failed spawn never loses the slot.
+        worker = self.idle.get()
+        try:
+            if worker is None:
+                worker = Worker()
+            metrics.increment('execution_runs')
+            try:
+                result = worker.run(code, self.limits, on_output)
+            except ExecutionTimeout:
+                metrics.increment('execution_timeout')
+                raise
+            stdout, stderr = result['stdout'], result['stderr']
+            if result.get('limit'):
+                metrics.increment(f"execution_{result['limit']}_limit")
+            if result.get('truncated'):
+                metrics.increment('execution_truncated')
+                note = f"\n... output truncated ({result['truncated']} characters omitted)"
+                if stderr:
+                    stderr += note
+                else:
+                    stdout += note
+            return stdout, stderr
+        finally:
+            if worker is not None and (worker.runs >= self.max_runs or not worker.alive()):
+                worker.stop()
+                worker = self.spawn()
+            self.idle.put(worker)
+
+    def shutdown(self):
+        self.closed = True
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.stop()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_limits = dict(DEFAULT_LIMITS)
+
+
+def configure(**limits):
+    with _pool_lock:
+        _limits.update((name, value) for name, value in limits.items() if name in DEFAULT_LIMITS)
+        if _pool is not None:
+            _pool.limits = dict(_limits)
+
+
+def limits():
+    with _pool_lock:
+        return dict(_limits)
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExecutorPool(limits=_limits)
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+
+
+class HistoryStore:
+    def __init__(self, path='chat_history.jsonl', legacy_path='chat_history.txt'):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+        if legacy_path and not os.path.exists(path) and os.path.exists(legacy_path):
+            self.import_legacy(legacy_path)
+
+    def import_legacy(self, legacy_path):
+        try:
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                lines = [line.rstrip('\n') for line in f if line.strip()]
+        except OSError:
+            return
+        for line in lines:
+            self.append('legacy', line)
+
+    def open_file(self):
+        if self.file is None:
+            self.file = open(self.path, 'ab')
+        return self.file
+
+    def append(self, role, content, language=None, result=None):
+        record = {
+            'role': role,
+            'timestamp': time.time(),
+            'language': language,
+            'content': content,
+            'result': result
+        }
+        line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+        with self.lock:
+            f = self.open_file()
+            offset = f.tell()
+            f.write(line)
+            f.flush()
+        record['offset'] = offset
+        record['end'] = offset + len(line)
+        return record
+
+    def iter_records(self, start=0):
+        # Reads forwards from the byte offset `start`, for consumers such as
+        # the search index that catch up on records appended since they last ran.
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                end = offset + len(line)
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        record = None
+                    if isinstance(record, dict):
+                        record['offset'] = offset
+                        record['end'] = end
+                        yield record
+                offset = end
+
+    def read_at(self, offset):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                line = f.readline()
+        except OSError:
+            return None
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict):
+            return None
+        record['offset'] = offset
+        record['end'] = offset + len(line)
+        return record
+
+    def size(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def load_page(self, before=None, limit=50, block_size=65536):
+        # Reads backwards from the byte offset `before` (end of file by default)
+        # and returns up to `limit` records oldest-first plus the offset of the
+        # first returned record, which is the cursor for the next older page.
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+            try:
+                f = open(self.path, 'rb')
+            except FileNotFoundError:
+                return [], 0
+            with f:
+                end = f.seek(0, os.SEEK_END) if before is None else before
+                position = end
+                buffer = b''
+                while position > 0 and buffer.count(b'\n') <= limit:
+                    read_size = min(block_size, position)
+                    position -= read_size
+                    f.seek(position)
+                    buffer = f.read(read_size) + buffer
+
+        entries = []
+        offset = position
+        for line in buffer.split(b'\n'):
+            entries.append((offset, line))
+            offset += len(line) + 1
+        if position > 0:
+            entries.pop(0)
+
+        records = []
+        cursor = 0
+        for offset, line in reversed(entries):
+            if len(records) == limit:
+                break
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            record['offset'] = offset
+            record['end'] = offset + len(line) + 1
+            records.append(record)
+            cursor = offset
+        records.reverse()
+        return records, cursor
+
+    def clear(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            open(self.path, 'wb').close()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
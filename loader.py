@@ -1,30 +1,85 @@
+import concurrent.futures
 import os
-import subprocess
 import sys
+import threading
+import time
+import backends
+import metrics
+
+def ollama_host():
+    return backends.get_backend().host
+
+def model_name(route='small'):
+    return backends.get_backend(route).model
+
+def model_routes():
+    return ['small', 'large'] if backends.has_route('large') else ['small']
+
+def list_models(timeout=2):
+    return backends.get_backend().list_models(timeout)
+
+def has_model(models, route='small'):
+    return backends.get_backend(route).has_model(models)
+
+def start_check():
+    future = concurrent.futures.Future()
+
+    def run():
+        try:
+            future.set_result(list_models())
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+def pull_model(on_progress=None, route='small'):
+    backends.get_backend(route).pull(on_progress)
 
 def check_ollama():
-    try:
-        subprocess.run(['ollama', 'list'], check=True, capture_output=True)
-        return True
-    except (subprocess.SubprocessError, FileNotFoundError):
+    if list_models() is None:
         print("Error: Ollama is not installed!")
         print("Please install Ollama from https://ollama.com")
         return False
+    return True
+
+def check_model(route='small'):
+    models = list_models()
+    return models is not None and has_model(models, route)
+
+def download_model():
+    for route in model_routes():
+        if not check_model(route):
+            print(f"Downloading model {model_name(route)}...")
+            pull_model(lambda status, completed, total: print(
+                f"{status} {completed * 100 // total}%" if total else status
+            ), route)
+        else:
+            print(f"Model {model_name(route)} is already installed")
+
+def keep_alive_value(settings):
+    if settings.get('pin_model', False):
+        return -1
+    return settings.get('keep_alive', '30m')
 
-def check_model():
+def warm_up(keep_alive='30m'):
+    backend = backends.get_backend()
+    start = time.perf_counter()
     try:
-        result = subprocess.run(['ollama', 'list'], check=True, capture_output=True, text=True)
-        return 'gemma3:1b' in result.stdout
+        load = backend.warm_up(keep_alive)
     except Exception as e:
-        print(f"Error checking installed models: {e}")
-        return False
+        print(f"Error warming up model {backend.model}: {e}")
+        return None
+    total = time.perf_counter() - start
+    metrics.record('warm_up', load=load, total=total)
+    return load
 
-def download_model():
-    if not check_model():
-        print("Downloading model gemma3:1b...")
-        subprocess.run(['ollama', 'pull', 'gemma3:1b'], check=True)
-    else:
-        print("Model gemma3:1b is already installed")
+def release_model():
+    backend = backends.get_backend()
+    try:
+        backend.release()
+    except Exception as e:
+        print(f"Error unloading model {backend.model}: {e}")
 
 def main():
     if check_ollama():
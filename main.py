@@ -1,8 +1,9 @@
 import sys
-import json
-import os
+import collections
+import threading
 from datetime import datetime
-from PyQt5.QtCore import Qt, QTranslator, QLocale, QSize, QPoint, pyqtSignal
+import startup
+from PyQt5.QtCore import Qt, QTranslator, QLocale, QSize, QPoint, QObject, QTimer, pyqtSignal
 from PyQt5.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -10,7 +11,6 @@ from PyQt5.QtWidgets import (
     QVBoxLayout,
     QHBoxLayout,
     QPushButton,
-    QTextEdit,
     QLabel,
     QComboBox,
     QStackedWidget,
@@ -18,11 +18,24 @@ from PyQt5.QtWidgets import (
     QSplitter,
     QFileDialog,
     QMessageBox,
-    QLineEdit
+    QLineEdit,
+    QCheckBox,
+    QProgressBar,
+    QListWidget,
+    QListWidgetItem
 )
 from PyQt5.QtGui import QIcon, QFont, QPalette, QColor, QPainter, QPainterPath
-import code
+import backends
+import executor
 import loader
+import metrics
+from chat_view import ChatModel, ChatView
+from conversation import Conversation
+from history import HistoryStore
+from sessions import DEFAULT_SESSION, SessionStore, make_title
+from settings_store import SettingsStore
+from theme_engine import ThemeEngine
+import tracing
 from translations import Translations
 
 
@@ -34,13 +47,6 @@ class ModernButton(QPushButton):
         self.setFont(QFont("Segoe UI", 10))
 
 
-class ModernTextEdit(QTextEdit):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.setFont(QFont("Segoe UI", 10))
-        self.setMinimumHeight(100)
-
-
 class ModernComboBox(QComboBox):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -55,6 +61,129 @@ class ModernLabel(QLabel):
         self.setFont(QFont("Segoe UI", 10))
 
 
+def load_settings():
+    return SettingsStore('settings.json')
+
+
+class ResponseJob(QObject):
+    started = pyqtSignal()
+    token_received = pyqtSignal(str)
+    output_received = pyqtSignal(str)
+    attempt_failed = pyqtSignal(int, str, str)
+    response_ready = pyqtSignal(str, str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, message, language, conversation=None, keep_alive=None, cache=None,
+                 repair_attempts=2, repair_budget=60.0, parent=None):
+        super().__init__(parent)
+        self.message = message
+        self.language = language
+        self.conversation = conversation
+        self.keep_alive = keep_alive
+        self.cache = cache
+        self.repair_attempts = repair_attempts
+        self.repair_budget = repair_budget
+        self.cancel_event = threading.Event()
+        self.user_message = None
+        self.response_message = None
+
+    def run(self):
+        import code
+
+        if self.cancel_event.is_set():
+            return
+        self.started.emit()
+        try:
+            content, response = code.stream_ai_response(
+                self.message,
+                self.language,
+                on_token=self.token_received.emit,
+                cancel_event=self.cancel_event,
+                conversation=self.conversation,
+                keep_alive=self.keep_alive,
+                cache=self.cache,
+                on_output=lambda stream, text: self.output_received.emit(text),
+                on_attempt=self.attempt_failed.emit,
+                repair_attempts=self.repair_attempts,
+                repair_budget=self.repair_budget
+            )
+        except code.GenerationCancelled:
+            pass
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.response_ready.emit(content, response)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+
+class ModelCheck(QObject):
+    progress = pyqtSignal(str, str, int, int)
+    checked = pyqtSignal(str)
+
+    def __init__(self, check, parent=None):
+        super().__init__(parent)
+        self.check = check
+
+    def start(self):
+        # A daemon thread rather than a QThread: a blocked HTTP request must
+        # not keep the application from exiting.
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        models = self.check.result()
+        if models is None:
+            self.checked.emit('unavailable')
+            return
+        # The large model is pulled as well; requests routed to it fall back
+        # to the small one, so only a missing small model stops the chat.
+        for route in loader.model_routes():
+            if loader.has_model(models, route):
+                continue
+            model = loader.model_name(route)
+            try:
+                loader.pull_model(
+                    lambda status, completed, total: self.progress.emit(model, status, completed, total), route
+                )
+            except Exception as e:
+                print(f"Error downloading model {model}: {e}")
+                if route == 'small':
+                    self.checked.emit('failed')
+                    return
+        self.checked.emit('ready')
+
+
+class ChatSession:
+    # What an open session keeps in memory: its history file, the rows
+    # loaded into its chat model, its model context and its search index.
+    def __init__(self, info, translate, conversation, parent=None):
+        self.id = info['id']
+        self.title = info['title']
+        self.history = HistoryStore(info['path'], legacy_path='chat_history.txt' if self.id == DEFAULT_SESSION else None)
+        self.index_path = info['index_path']
+        self.chat_model = ChatModel(self.history, translate, parent)
+        self.conversation = conversation
+        self.search_index = None
+        self.scroll_state = None
+        self.loaded = False
+
+    def get_search_index(self):
+        # Records appended while the session was closed are indexed on a
+        # background thread; new ones are added as they are saved.
+        if self.search_index is None:
+            from search_index import SearchIndex
+            self.search_index = SearchIndex(self.history, self.index_path)
+            threading.Thread(target=self.search_index.sync, daemon=True).start()
+        return self.search_index
+
+    def close(self):
+        if self.search_index is not None:
+            self.search_index.close()
+        self.history.close()
+        self.chat_model.deleteLater()
+
+
 class SettingsTab(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -66,14 +195,15 @@ class SettingsTab(QWidget):
         
         layout.addWidget(ModernLabel(self.tr("Language")))
         self.language_combo = ModernComboBox()
-        self.language_combo.addItems(['English', 'Русский', 'Deutsch'])
+        self.language_combo.addItems(list(self.parent.translations.languages.values()))
         self.language_combo.setCurrentText(self.get_language_name(self.parent.settings['language']))
         self.language_combo.currentTextChanged.connect(self.change_language)
         layout.addWidget(self.language_combo)
         
         layout.addWidget(ModernLabel(self.tr("Theme")))
         self.theme_combo = ModernComboBox()
-        self.theme_combo.addItems(["Default"])
+        self.theme_combo.addItems(self.parent.themes.names())
+        self.theme_combo.setCurrentText(self.parent.settings.get('theme', 'default'))
         self.theme_combo.currentTextChanged.connect(self.change_theme)
         layout.addWidget(self.theme_combo)
         
@@ -84,62 +214,136 @@ class SettingsTab(QWidget):
         self.mode_combo.currentTextChanged.connect(self.change_mode)
         layout.addWidget(self.mode_combo)
         
-        layout.addStretch()
-    
-    def load_themes(self):
-        themes_dir = "themes"
-        if not os.path.exists(themes_dir):
-            os.makedirs(themes_dir)
+        self.pin_model_check = QCheckBox(self.tr("Keep model loaded"))
+        self.pin_model_check.setFont(QFont("Segoe UI", 10))
+        self.pin_model_check.setChecked(self.parent.settings.get('pin_model', False))
+        self.pin_model_check.toggled.connect(self.change_pin_model)
+        layout.addWidget(self.pin_model_check)
+        
+        self.cache_check = QCheckBox(self.tr("Cache responses"))
+        self.cache_check.setFont(QFont("Segoe UI", 10))
+        self.cache_check.setChecked(self.parent.settings.get('response_cache', False))
+        self.cache_check.toggled.connect(self.change_response_cache)
+        layout.addWidget(self.cache_check)
         
-        themes = []
-        for theme_file in os.listdir(themes_dir):
-            if theme_file.endswith('.json'):
-                themes.append(theme_file[:-5])  # убираем .json
+        self.stats_label = ModernLabel()
+        self.stats_label.setWordWrap(True)
+        layout.addWidget(self.stats_label)
         
-        self.theme_combo.addItems(themes)
+        layout.addStretch()
     
     def get_language_name(self, code):
-        return {
-            'en': 'English',
-            'ru': 'Русский',
-            'de': 'Deutsch'
-        }.get(code, 'English')
+        return self.parent.translations.get_language_name(code)
     
     def get_language_code(self, name):
-        return {
-            'English': 'en',
-            'Русский': 'ru',
-            'Deutsch': 'de'
-        }.get(name, 'en')
+        return self.parent.translations.get_language_code(name)
     
     def change_language(self, language):
         code = self.get_language_code(language)
-        self.parent.settings['language'] = code
+        self.parent.settings.set('language', code)
         self.parent.translations.set_language(code)
         self.parent.update_translations()
-        self.parent.save_settings()
+    
+    def update_themes(self):
+        names = self.parent.themes.names()
+        if names != [self.theme_combo.itemText(i) for i in range(self.theme_combo.count())]:
+            self.theme_combo.blockSignals(True)
+            self.theme_combo.clear()
+            self.theme_combo.addItems(names)
+            self.theme_combo.setCurrentText(self.parent.settings.get('theme', 'default'))
+            self.theme_combo.blockSignals(False)
     
     def change_theme(self, theme_name):
-        self.parent.apply_theme(theme_name, "dark" if self.mode_combo.currentText() == "Dark" else "light")
+        self.parent.settings.set('theme', theme_name)
+        self.parent.apply_theme(theme_name, "dark" if self.parent.settings['dark_mode'] else "light")
+    
+    def change_pin_model(self, pinned):
+        self.parent.settings.set('pin_model', pinned)
+        self.parent.warm_up_model()
+    
+    def change_response_cache(self, enabled):
+        self.parent.settings.set('response_cache', enabled)
+        self.update_stats()
+    
+    def update_stats(self):
+        import code
+
+        queue = self.parent.get_scheduler().stats()
+        lines = [
+            f"{self.parent.tr('Queue')}: {queue['queued']} {self.parent.tr('waiting')}, "
+            f"{queue['running']} {self.parent.tr('running')}, "
+            f"{self.parent.tr('average wait')} {queue['average_wait']:.2f}s"
+        ]
+        cache = self.parent.get_response_cache()
+        if cache is not None:
+            stats = cache.stats()
+            lines.append(
+                f"{self.parent.tr('Cache')}: {stats['hits']} / {stats['hits'] + stats['misses']} "
+                f"({stats['hit_rate']:.0%}), {stats['entries']} {self.parent.tr('entries')}, "
+                f"{stats['bytes'] / 1024:.0f} KB"
+            )
+        for route, stats in code.route_stats().items():
+            lines.append(
+                f"{self.parent.tr('Route')} {route}: {stats['success_rate']:.0%} {self.parent.tr('successful')}, "
+                f"{self.parent.tr('average')} {stats['average_latency']:.2f}s ({stats['count']})"
+            )
+        warm_up = metrics.last('warm_up')
+        first_tokens = sorted(
+            event['first_token'] for event in metrics.events('generation') if event['first_token'] is not None
+        )
+        if (warm_up and warm_up['load'] is not None) or first_tokens:
+            # Loading the model and answering are reported apart, so a slow
+            # reply can be told from a cold model.
+            parts = []
+            if warm_up and warm_up['load'] is not None:
+                parts.append(f"{self.parent.tr('Model load')} {warm_up['load']:.2f}s")
+            if first_tokens:
+                parts.append(
+                    f"{self.parent.tr('first token')} p50 {first_tokens[len(first_tokens) // 2]:.2f}s "
+                    f"({len(first_tokens)})"
+                )
+            lines.append(", ".join(parts))
+        for name, stats in tracing.summary().items():
+            lines.append(f"{name}: p50 {stats['p50'] * 1000:.1f} ms, p95 {stats['p95'] * 1000:.1f} ms ({stats['count']})")
+        self.stats_label.setText("\n".join(lines))
     
     def change_mode(self, mode):
-        self.parent.settings['dark_mode'] = (mode == self.tr("Dark"))
+        self.parent.settings.set('dark_mode', mode == self.tr("Dark"))
         self.parent.apply_theme(self.theme_combo.currentText(), "dark" if mode == self.tr("Dark") else "light")
-        self.parent.save_settings()
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    MAX_OPEN_SESSIONS = 8
+
+    def __init__(self, startup_check=None, settings=None):
         super().__init__()
         self.old_pos = None
+        self.jobs = []
+        self.pending_output = {}
+        self.output_timer = QTimer(self)
+        self.output_timer.setSingleShot(True)
+        self.output_timer.setInterval(100)
+        self.output_timer.timeout.connect(self.flush_output)
         
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
         self.setAttribute(Qt.WA_TranslucentBackground)
         self.setAttribute(Qt.WA_NoSystemBackground)
         
-        self.settings = self.load_settings()
+        self.settings = settings if settings is not None else self.load_settings()
         self.translations = Translations()
         self.translations.set_language(self.settings['language'])
+        tracing.configure(self.settings.get('trace_file', 'trace.json'), self.settings.get('tracing', True))
+        backends.configure(self.settings)
+        executor.configure(**{
+            name: self.settings[f'execution_{name}']
+            for name in executor.DEFAULT_LIMITS if f'execution_{name}' in self.settings
+        })
+        self.scheduler = None
+        self.response_cache = None
+        self.sessions = SessionStore()
+        self.open_sessions = collections.OrderedDict()
+        self.session = None
+        self.session = self.open_session(self.settings.get('session', DEFAULT_SESSION))
         
         self.central_widget = QWidget()
         self.setCentralWidget(self.central_widget)
@@ -163,6 +367,17 @@ class MainWindow(QMainWindow):
         self.settings_btn.clicked.connect(self.toggle_settings)
         top_layout.addWidget(self.settings_btn)
         
+        self.session_combo = ModernComboBox()
+        self.session_combo.setMinimumWidth(240)
+        self.session_combo.activated.connect(lambda index: self.switch_session(self.session_combo.itemData(index)))
+        top_layout.addWidget(self.session_combo)
+        
+        self.new_session_btn = ModernButton("+")
+        self.new_session_btn.setFixedSize(30, 30)
+        self.new_session_btn.setToolTip(self.tr("New chat"))
+        self.new_session_btn.clicked.connect(self.new_session)
+        top_layout.addWidget(self.new_session_btn)
+        
         top_layout.addStretch()
         
         minimize_btn = ModernButton("🗕")
@@ -187,12 +402,26 @@ class MainWindow(QMainWindow):
         chat_widget = QWidget()
         chat_layout = QVBoxLayout(chat_widget)
         
+        search_layout = QHBoxLayout()
+        self.search_field = QLineEdit()
+        self.search_field.setPlaceholderText(self.tr("Search history"))
+        self.search_field.setClearButtonEnabled(True)
+        self.search_field.textChanged.connect(lambda: self.search_timer.start())
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.run_search)
         clear_history_btn = ModernButton(self.tr("Clear History"))
         clear_history_btn.clicked.connect(self.clear_chat_history)
-        chat_layout.addWidget(clear_history_btn)
+        search_layout.addWidget(self.search_field)
+        search_layout.addWidget(clear_history_btn)
+        chat_layout.addLayout(search_layout)
         
-        self.chat_area = ModernTextEdit()
-        self.chat_area.setReadOnly(True)
+        self.chat_area = ChatView(self.session.chat_model)
+        self.search_results = QListWidget()
+        self.search_results.setWordWrap(True)
+        self.search_results.itemActivated.connect(self.on_search_result_activated)
+        self.search_results.hide()
         
         input_layout = QHBoxLayout()
         self.input_field = QLineEdit()
@@ -203,10 +432,26 @@ class MainWindow(QMainWindow):
         self.send_button = ModernButton(self.tr("Send"))
         self.send_button.clicked.connect(self.send_message)
         
+        self.stop_button = ModernButton(self.tr("Stop"))
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.cancel_response)
+        
         input_layout.addWidget(self.input_field)
         input_layout.addWidget(self.send_button)
+        input_layout.addWidget(self.stop_button)
+        
+        self.status_label = ModernLabel()
+        self.status_label.setWordWrap(True)
+        self.status_label.hide()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setTextVisible(False)
+        self.progress_bar.setMaximumHeight(6)
+        self.progress_bar.hide()
         
         chat_layout.addWidget(self.chat_area)
+        chat_layout.addWidget(self.search_results)
+        chat_layout.addWidget(self.status_label)
+        chat_layout.addWidget(self.progress_bar)
         chat_layout.addLayout(input_layout)
         
         self.tab_widget = QStackedWidget()
@@ -217,8 +462,7 @@ class MainWindow(QMainWindow):
         chat_tab_layout.addWidget(chat_widget)
         self.tab_widget.addWidget(chat_tab)
         
-        self.settings_tab = SettingsTab(self)
-        self.tab_widget.addWidget(self.settings_tab)
+        self.settings_tab = None
         
         content_layout.addWidget(self.tab_widget)
         
@@ -228,9 +472,48 @@ class MainWindow(QMainWindow):
         
         self.setMinimumSize(800, 600)
         
-        self.apply_theme("default", "dark" if self.settings['dark_mode'] else "light")
-        self.load_chat_history()
+        self.themes = ThemeEngine(parent=self)
+        self.themes.changed.connect(self.on_theme_changed)
+        self.apply_theme(self.settings.get('theme', 'default'), "dark" if self.settings['dark_mode'] else "light")
+        self.update_session_list()
+        # History is read once the window has been shown.
+        QTimer.singleShot(0, self.load_chat_history)
         self.center_window()
+        
+        self.model_check = ModelCheck(startup_check or loader.start_check(), self)
+        self.model_check.progress.connect(self.on_model_progress)
+        self.model_check.checked.connect(self.on_model_checked)
+        self.model_check.start()
+    
+    def on_model_progress(self, model, status, completed, total):
+        self.status_label.setText(f"{self.tr('Downloading model')} {model}: {status}")
+        self.status_label.show()
+        if total:
+            self.progress_bar.setRange(0, 1000)
+            self.progress_bar.setValue(completed * 1000 // total)
+        else:
+            self.progress_bar.setRange(0, 0)
+        self.progress_bar.show()
+    
+    def on_model_checked(self, result):
+        self.progress_bar.hide()
+        if result == 'ready':
+            self.status_label.hide()
+            if self.settings.get('warm_up', True):
+                self.warm_up_model()
+        elif result == 'unavailable':
+            self.status_label.setText(self.tr("Ollama is not running. Install it from https://ollama.com"))
+            self.status_label.show()
+        else:
+            self.status_label.setText(f"{self.tr('Could not download model')} {loader.model_name()}")
+            self.status_label.show()
+    
+    def warm_up_model(self):
+        threading.Thread(
+            target=loader.warm_up,
+            args=(loader.keep_alive_value(self.settings),),
+            daemon=True
+        ).start()
     
     def center_window(self):
         screen = QApplication.primaryScreen().geometry()
@@ -240,21 +523,135 @@ class MainWindow(QMainWindow):
         self.move(x, y)
     
     def load_settings(self):
-        try:
-            with open('settings.json', 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {
-                'language': 'en',
-                'dark_mode': True
-            }
-    
-    def save_settings(self):
-        with open('settings.json', 'w', encoding='utf-8') as f:
-            json.dump(self.settings, f, ensure_ascii=False, indent=4)
+        return load_settings()
+    
+    def get_scheduler(self):
+        if self.scheduler is None:
+            from scheduler import RequestScheduler
+            self.scheduler = RequestScheduler(self.settings.get('max_concurrent_requests', 2))
+        return self.scheduler
+    
+    def get_settings_tab(self):
+        # Built the first time it is opened; many sessions never open it.
+        if self.settings_tab is None:
+            self.settings_tab = SettingsTab(self)
+            self.tab_widget.addWidget(self.settings_tab)
+        return self.settings_tab
+    
+    def get_response_cache(self):
+        if not self.settings.get('response_cache', False):
+            return None
+        if self.response_cache is None:
+            from response_cache import ResponseCache
+            self.response_cache = ResponseCache(
+                max_entries=self.settings.get('response_cache_max_entries', 500),
+                max_bytes=self.settings.get('response_cache_max_mb', 10) * 1024 * 1024,
+                ttl=self.settings.get('response_cache_ttl', 7 * 24 * 3600)
+            )
+        return self.response_cache
+    
+    def open_session(self, session_id):
+        # The last few sessions stay open, so switching back to one shows
+        # its loaded rows again without reading its history file.
+        info = self.sessions.get(session_id) or self.sessions.get(DEFAULT_SESSION)
+        session = self.open_sessions.get(info['id'])
+        if session is None:
+            conversation = Conversation(
+                token_budget=self.settings.get('context_tokens', 2048),
+                strategy=self.settings.get('context_strategy', 'truncate')
+            )
+            session = ChatSession(info, self.tr, conversation, self)
+            self.open_sessions[session.id] = session
+        self.open_sessions.move_to_end(session.id)
+        self.close_idle_sessions(session)
+        return session
+    
+    def close_idle_sessions(self, keep):
+        busy = {job.session for job in self.jobs}
+        for session in list(self.open_sessions.values()):
+            if len(self.open_sessions) <= self.MAX_OPEN_SESSIONS:
+                break
+            if session is not keep and session is not self.session and session not in busy:
+                session.close()
+                del self.open_sessions[session.id]
+    
+    def switch_session(self, session_id):
+        if session_id is None or session_id == self.session.id:
+            return
+        self.session.scroll_state = self.chat_area.scroll_state()
+        self.session = self.open_session(session_id)
+        self.settings.set('session', self.session.id)
+        self.sessions.touch(self.session.id)
+        self.search_field.clear()
+        self.chat_area.set_chat_model(self.session.chat_model, self.session.scroll_state)
+        if not self.session.loaded:
+            self.load_session_rows()
+        self.update_stop_button()
+        self.update_session_list()
+    
+    def new_session(self):
+        # An empty session is reused rather than adding another one.
+        if not self.session.chat_model.messages and not self.sessions.get(self.session.id)['message_count']:
+            return
+        self.switch_session(self.sessions.create()['id'])
+    
+    def update_session_list(self):
+        # Only session metadata is read here; history files are opened when
+        # a session is switched to.
+        self.session_combo.clear()
+        for info in self.sessions.list():
+            self.session_combo.addItem(info['title'] or self.tr("New chat"), info['id'])
+            last_used = datetime.fromtimestamp(info['last_used']).strftime('%Y-%m-%d %H:%M')
+            self.session_combo.setItemData(
+                self.session_combo.count() - 1,
+                f"{info['message_count']} {self.tr('messages')} · {last_used}",
+                Qt.ToolTipRole
+            )
+        self.session_combo.setCurrentIndex(self.session_combo.findData(self.session.id))
+    
+    def run_search(self):
+        query = self.search_field.text().strip()
+        self.search_results.clear()
+        if not query:
+            self.search_results.hide()
+            self.chat_area.show()
+            return
+        with tracing.span('history search'):
+            results = self.session.get_search_index().search(query, self.settings['language'])
+        for record in results:
+            label = self.chat_area.chat_model.label(record)
+            when = datetime.fromtimestamp(record['timestamp']).strftime('%Y-%m-%d %H:%M') if record.get('timestamp') else ''
+            header = ' · '.join(part for part in (label, when) if part)
+            item = QListWidgetItem(f"{header}\n{record['snippet']}" if header else record['snippet'])
+            item.setData(Qt.UserRole, (record['offset'], record['end']))
+            self.search_results.addItem(item)
+        if not results:
+            item = QListWidgetItem(self.tr("No results"))
+            item.setFlags(Qt.NoItemFlags)
+            self.search_results.addItem(item)
+        self.chat_area.hide()
+        self.search_results.show()
+    
+    def on_search_result_activated(self, item):
+        location = item.data(Qt.UserRole)
+        if location is None:
+            return
+        self.search_field.blockSignals(True)
+        self.search_field.clear()
+        self.search_field.blockSignals(False)
+        self.search_results.hide()
+        self.chat_area.show()
+        # Reloading the view would drop the rows of a response still being
+        # written, so older pages are only opened while nothing is running.
+        busy = bool(self.session_jobs())
+        if not self.chat_area.show_record(*location, reload=not busy):
+            self.status_label.setText(self.tr("Wait for the response to finish to open older messages"))
+            self.status_label.show()
+            QTimer.singleShot(3000, self.status_label.hide)
     
     def toggle_settings(self):
         if self.tab_widget.currentIndex() == 0:
+            self.get_settings_tab().update_stats()
             self.tab_widget.setCurrentIndex(1)
             self.settings_btn.setText("←")
         else:
@@ -267,29 +664,132 @@ class MainWindow(QMainWindow):
             return
         
         self.input_field.clear()
-        self.chat_area.append(f"<b>{self.tr('You')}:</b> {message}")
-        
-        try:
-            response = code.get_ai_response(message, self.settings['language'])
-            self.chat_area.append(f"<b>{self.tr('Dave')}:</b> {response}")
-            self.save_chat_history()
-        except Exception as e:
-            self.chat_area.append(f"<b>{self.tr('Error')}:</b> {str(e)}")
+        job = ResponseJob(
+            message,
+            self.settings['language'],
+            self.session.conversation,
+            loader.keep_alive_value(self.settings),
+            self.get_response_cache(),
+            self.settings.get('repair_attempts', 2),
+            self.settings.get('repair_time_budget', 60)
+        )
+        job.session = self.session
+        job.user_message = self.chat_area.append_message({'role': 'user', 'content': message})
+        job.response_message = self.chat_area.append_message({'role': 'assistant', 'content': '', 'result': None})
+        job.started.connect(lambda: self.on_response_started(job))
+        job.token_received.connect(lambda token: self.on_token_received(job, token))
+        job.output_received.connect(lambda text: self.on_output_received(job, text))
+        job.attempt_failed.connect(lambda attempt, content, error: self.on_attempt_failed(job, attempt, content, error))
+        job.response_ready.connect(lambda content, response: self.on_response_ready(job, content, response))
+        job.failed.connect(lambda error: self.on_response_failed(job, error))
+        self.jobs.append(job)
+        self.update_stop_button()
+        # Each turn builds on the one before, so a session's messages run one
+        # at a time; max_concurrent_requests bounds how many sessions
+        # generate at once.
+        self.get_scheduler().submit(self.session.id, job.run)
+    
+    def cancel_response(self):
+        # Stop belongs to the chat on screen; other sessions keep generating.
+        for job in self.session_jobs():
+            job.cancel()
+            self.finish_response(job, result=f"[{self.tr('Cancelled')}]")
+    
+    def session_jobs(self):
+        return [job for job in self.jobs if job.session is self.session]
+    
+    def update_stop_button(self):
+        self.stop_button.setEnabled(bool(self.session_jobs()))
+    
+    def chat_of(self, job):
+        # A job keeps writing into its own session's rows while another
+        # session is shown.
+        return self.chat_area if job.session is self.session else job.session.chat_model
+    
+    def finish_response(self, job, **fields):
+        self.pending_output.pop(job, None)
+        self.chat_of(job).update_message(job.response_message, **fields)
+        self.jobs.remove(job)
+        self.update_stop_button()
+        self.update_session_list()
+    
+    def on_response_started(self, job):
+        # The user message is written when its turn starts so the history file
+        # keeps question/answer order even when several messages are queued.
+        if job in self.jobs:
+            record = self.save_history_record(job.session, 'user', job.message)
+            self.chat_of(job).update_message(job.user_message, offset=record.get('offset'))
+    
+    def on_token_received(self, job, token):
+        if job in self.jobs:
+            message = job.response_message
+            self.chat_of(job).update_message(message, content=message['content'] + token)
+    
+    def on_output_received(self, job, text):
+        # Output is collected and shown at most every 100 ms, so a script
+        # printing thousands of lines does not relayout the view for each one.
+        if job in self.jobs:
+            self.pending_output.setdefault(job, []).append(text)
+            if not self.output_timer.isActive():
+                self.output_timer.start()
+    
+    def flush_output(self):
+        pending, self.pending_output = self.pending_output, {}
+        for job, texts in pending.items():
+            message = job.response_message
+            self.chat_of(job).update_message(message, result=(message.get('result') or '') + ''.join(texts))
     
-    def save_chat_history(self):
+    def on_attempt_failed(self, job, attempt, content, error):
+        # The failed attempt keeps its row and the repair streams into a new one.
+        if job in self.jobs:
+            self.pending_output.pop(job, None)
+            message = job.response_message
+            record = self.save_history_record(job.session, message['role'], content, error)
+            self.chat_of(job).update_message(message, content=content, result=error, offset=record.get('offset'))
+            job.response_message = self.chat_of(job).append_message(
+                {'role': 'repair', 'content': '', 'result': None, 'attempt': attempt}
+            )
+    
+    def on_response_ready(self, job, content, response):
+        if job in self.jobs:
+            record = self.save_history_record(job.session, job.response_message['role'], content, response)
+            self.finish_response(job, result=response, offset=record.get('offset'))
+    
+    def on_response_failed(self, job, error):
+        if job in self.jobs:
+            record = self.save_history_record(job.session, 'error', error)
+            self.finish_response(job, role='error', content=error, result=None, attempt=None, offset=record.get('offset'))
+    
+    def save_history_record(self, session, role, content, result=None):
         try:
-            with open('chat_history.txt', 'w', encoding='utf-8') as f:
-                f.write(self.chat_area.toPlainText())
-        except:
-            pass
+            with tracing.span('history save'):
+                record = session.history.append(role, content, self.settings['language'], result)
+            if session.search_index is not None:
+                session.search_index.add(record)
+        except OSError as e:
+            print(f"Error saving chat history: {e}")
+            return {'role': role, 'content': content, 'result': result}
+        self.sessions.touch(session.id, added=1)
+        if role == 'user' and not session.title:
+            session.title = make_title(content)
+            self.sessions.rename(session.id, session.title)
+            self.update_session_list()
+        return record
     
     def load_chat_history(self):
+        self.load_session_rows()
+        startup.mark('history')
+        # Worker interpreters start importing now, so the first snippet of
+        # the session does not wait for them.
+        threading.Thread(target=executor.get_pool, daemon=True).start()
+    
+    def load_session_rows(self):
         try:
-            if os.path.exists('chat_history.txt'):
-                with open('chat_history.txt', 'r', encoding='utf-8') as f:
-                    self.chat_area.setText(f.read())
-        except:
-            pass
+            self.chat_area.load_latest()
+        except OSError as e:
+            print(f"Error loading chat history: {e}")
+        self.session.loaded = True
+        QTimer.singleShot(0, self.session.get_search_index)
     
     def tr(self, text):
         return self.translations.get_translation(self.settings['language'], text)
@@ -307,6 +807,18 @@ class MainWindow(QMainWindow):
     def mouseReleaseEvent(self, event):
         self.old_pos = None
     
+    def closeEvent(self, event):
+        self.cancel_response()
+        if self.scheduler is not None:
+            self.scheduler.shutdown()
+        if self.settings.get('pin_model', False):
+            loader.release_model()
+        for session in self.open_sessions.values():
+            session.close()
+        self.sessions.close()
+        self.settings.close()
+        super().closeEvent(event)
+    
     def clear_chat_history(self):
         reply = QMessageBox.question(self, self.tr("Confirmation"),
                                    self.tr("Are you sure you want to clear chat history?"),
@@ -314,152 +826,58 @@ class MainWindow(QMainWindow):
         
         if reply == QMessageBox.Yes:
             self.chat_area.clear()
-            self.save_chat_history()
+            self.session.conversation.clear()
+            self.session.history.clear()
+            if self.session.search_index is not None:
+                self.session.search_index.clear()
+            self.session.title = ''
+            self.sessions.reset(self.session.id)
+            self.update_session_list()
     
     def apply_theme(self, theme_name, mode):
-        if theme_name == "default":
-            if mode == "dark":
-                self.container.setStyleSheet("""
-                    QWidget#container {
-                        background-color: #2b2b2b;
-                        border: 1px solid #3d3d3d;
-                        border-radius: 10px;
-                    }
-                    QTextEdit {
-                        background-color: #1e1e1e;
-                        color: #ffffff;
-                        border: 1px solid #3d3d3d;
-                        border-radius: 5px;
-                    }
-                    QLineEdit {
-                        background-color: #1e1e1e;
-                        color: #ffffff;
-                        border: 1px solid #3d3d3d;
-                        border-radius: 5px;
-                    }
-                    QPushButton {
-                        background-color: #0d47a1;
-                        color: white;
-                        border: none;
-                        border-radius: 5px;
-                    }
-                    QPushButton:hover {
-                        background-color: #1565c0;
-                    }
-                    QPushButton#closeButton {
-                        background-color: #dc3545;
-                    }
-                    QPushButton#closeButton:hover {
-                        background-color: #c82333;
-                    }
-                    QPushButton#minimizeButton {
-                        background-color: #6c757d;
-                    }
-                    QPushButton#minimizeButton:hover {
-                        background-color: #5a6268;
-                    }
-                    QComboBox {
-                        background-color: #1e1e1e;
-                        color: #ffffff;
-                        border: 1px solid #3d3d3d;
-                        border-radius: 5px;
-                    }
-                    QComboBox::drop-down {
-                        border: none;
-                    }
-                    QComboBox::down-arrow {
-                        image: none;
-                        border: none;
-                    }
-                """)
-            else:
-                self.container.setStyleSheet("""
-                    QWidget#container {
-                        background-color: #ffffff;
-                        border: 1px solid #e0e0e0;
-                        border-radius: 10px;
-                    }
-                    QTextEdit {
-                        background-color: #f5f5f5;
-                        color: #000000;
-                        border: 1px solid #e0e0e0;
-                        border-radius: 5px;
-                    }
-                    QLineEdit {
-                        background-color: #f5f5f5;
-                        color: #000000;
-                        border: 1px solid #e0e0e0;
-                        border-radius: 5px;
-                    }
-                    QPushButton {
-                        background-color: #0d47a1;
-                        color: white;
-                        border: none;
-                        border-radius: 5px;
-                    }
-                    QPushButton:hover {
-                        background-color: #1565c0;
-                    }
-                    QPushButton#closeButton {
-                        background-color: #dc3545;
-                    }
-                    QPushButton#closeButton:hover {
-                        background-color: #c82333;
-                    }
-                    QPushButton#minimizeButton {
-                        background-color: #6c757d;
-                    }
-                    QPushButton#minimizeButton:hover {
-                        background-color: #5a6268;
-                    }
-                    QComboBox {
-                        background-color: #f5f5f5;
-                        color: #000000;
-                        border: 1px solid #e0e0e0;
-                        border-radius: 5px;
-                    }
-                    QComboBox::drop-down {
-                        border: none;
-                    }
-                    QComboBox::down-arrow {
-                        image: none;
-                        border: none;
-                    }
-                """)
+        # Each (theme, mode) stylesheet is rendered once by the engine and set
+        # on the window only when it differs from the current one.
+        self.current_theme = (theme_name, mode)
+        stylesheet = self.themes.stylesheet(theme_name, mode)
+        if stylesheet != self.styleSheet():
+            self.setStyleSheet(stylesheet)
+    
+    def on_theme_changed(self, name):
+        if self.settings_tab is not None:
+            self.settings_tab.update_themes()
+        if name in ('', self.current_theme[0], 'default'):
+            self.apply_theme(*self.current_theme)
 
     def update_translations(self):
         self.settings_btn.setText("⚙")
         self.send_button.setText(self.tr("Send"))
-        self.settings_tab.language_combo.setCurrentText(self.get_language_name(self.settings['language']))
-        self.settings_tab.mode_combo.setCurrentText(self.tr("Dark") if self.settings['dark_mode'] else self.tr("Light"))
-        
-        current_text = self.chat_area.toPlainText()
-        if current_text:
-            translations = {
-                "You:": self.tr("You:"),
-                "Dave:": self.tr("Dave:"),
-                "Error:": self.tr("Error:"),
-                "Clear History": self.tr("Clear History"),
-                "Send": self.tr("Send"),
-                "Confirmation": self.tr("Confirmation"),
-                "Are you sure you want to clear chat history?": self.tr("Are you sure you want to clear chat history?"),
-                "Yes": self.tr("Yes"),
-                "No": self.tr("No")
-            }
+        self.stop_button.setText(self.tr("Stop"))
+        self.search_field.setPlaceholderText(self.tr("Search history"))
+        self.new_session_btn.setToolTip(self.tr("New chat"))
+        self.update_session_list()
+        self.chat_area.retranslate()
+        
+        if self.settings_tab is not None:
+            self.settings_tab.pin_model_check.setText(self.tr("Keep model loaded"))
+            self.settings_tab.cache_check.setText(self.tr("Cache responses"))
+            self.settings_tab.update_stats()
+            # Syncing the combos must not re-enter their change handlers.
+            for combo, text in (
+                (self.settings_tab.language_combo, self.settings_tab.get_language_name(self.settings['language'])),
+                (self.settings_tab.mode_combo, self.tr("Dark") if self.settings['dark_mode'] else self.tr("Light"))
+            ):
+                combo.blockSignals(True)
+                combo.setCurrentText(text)
+                combo.blockSignals(False)
             
-            for eng, translated in translations.items():
-                current_text = current_text.replace(eng, translated)
-            
-            self.chat_area.setText(current_text)
-        
-        for label in self.settings_tab.findChildren(ModernLabel):
-            if label.text() in ["Language", "Theme", "Mode", "Язык", "Тема", "Режим", "Sprache", "Thema", "Modus"]:
-                if label.text() in ["Language", "Язык", "Sprache"]:
-                    label.setText(self.tr("Language"))
-                elif label.text() in ["Theme", "Тема", "Thema"]:
-                    label.setText(self.tr("Theme"))
-                elif label.text() in ["Mode", "Режим", "Modus"]:
-                    label.setText(self.tr("Mode"))
+            for label in self.settings_tab.findChildren(ModernLabel):
+                if label.text() in ["Language", "Theme", "Mode", "Язык", "Тема", "Режим", "Sprache", "Thema", "Modus"]:
+                    if label.text() in ["Language", "Язык", "Sprache"]:
+                        label.setText(self.tr("Language"))
+                    elif label.text() in ["Theme", "Тема", "Thema"]:
+                        label.setText(self.tr("Theme"))
+                    elif label.text() in ["Mode", "Режим", "Modus"]:
+                        label.setText(self.tr("Mode"))
         
         for btn in self.findChildren(ModernButton):
             if btn.text() in ["Clear History", "Очистить историю", "Geschichte löschen"]:
@@ -467,13 +885,22 @@ class MainWindow(QMainWindow):
 
 
 if __name__ == '__main__':
-    loader.main()
+    startup.profile_imports()
+    startup.mark('imports')
+    settings = load_settings()
+    backends.configure(settings)
+    startup_check = loader.start_check()
     
     app = QApplication(sys.argv)
     
     app.setFont(QFont("Segoe UI", 10))
+    startup.mark('application')
     
-    window = MainWindow()
+    window = MainWindow(startup_check, settings)
+    startup.mark('window')
     window.show()
+    startup.mark('show')
+    if startup.enabled():
+        QTimer.singleShot(0, lambda: (startup.mark('event loop'), startup.report()))
     
     sys.exit(app.exec_())
@@ -0,0 +1,40 @@
+import threading
+import time
+
+
+HISTORY_SIZE = 500
+
+_lock = threading.Lock()
+_events = {}
+_counters = {}
+
+
+def record(name, **fields):
+    fields.setdefault('time', time.time())
+    with _lock:
+        events = _events.setdefault(name, [])
+        events.append(fields)
+        del events[:-HISTORY_SIZE]
+    return fields
+
+
+def increment(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+        return _counters[name]
+
+
+def events(name):
+    with _lock:
+        return list(_events.get(name, []))
+
+
+def last(name):
+    with _lock:
+        events = _events.get(name)
+        return dict(events[-1]) if events else None
+
+
+def counter(name):
+    with _lock:
+        return _counters.get(name, 0)
@@ -0,0 +1,142 @@
+import ast
+import builtins
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+import metrics
+
+
+PURE_BUILTINS = {
+    'print', 'len', 'str', 'int', 'float', 'bool', 'range', 'sum', 'min', 'max', 'abs', 'round',
+    'sorted', 'reversed', 'enumerate', 'zip', 'list', 'dict', 'set', 'tuple', 'format', 'repr',
+    'any', 'all', 'map', 'filter', 'chr', 'ord'
+}
+BUILTIN_NAMES = set(dir(builtins))
+
+
+def normalize_input(text):
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+def make_key(user_input, language, model, prompt_version, options=None, context=None):
+    # `context` is the conversation before this turn. A follow-up such as
+    # "yes" means something different in every conversation, so it only
+    # matches the same request after the same earlier turns.
+    fields = [normalize_input(user_input), language, model, prompt_version, options or {}]
+    if context:
+        fields.append([[message['role'], message['content']] for message in context])
+    payload = json.dumps(fields, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def has_side_effects(code):
+    # Only code that imports nothing and uses a few pure builtins (or calls
+    # methods on its own values) may have its printed output replayed.
+    # Everything else touches the machine or reads state that can change.
+    # Builtins count wherever they appear, since map(open, paths) calls
+    # open without naming it as the function of a call.
+    if not code:
+        return False
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return True
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.Global, ast.Nonlocal)):
+            return True
+        if isinstance(node, ast.Name) and node.id in BUILTIN_NAMES and node.id not in PURE_BUILTINS:
+            return True
+        if isinstance(node, ast.Call):
+            func = node.func
+            if isinstance(func, ast.Name) and func.id not in PURE_BUILTINS:
+                return True
+            if isinstance(func, ast.Attribute) and not isinstance(func.value, (ast.Constant, ast.JoinedStr)):
+                return True
+    return False
+
+
+class ResponseCache:
+    def __init__(self, path='response_cache.sqlite3', max_entries=500, max_bytes=10 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, content TEXT, code TEXT, result TEXT, side_effects INTEGER, '
+            'size INTEGER, created REAL, last_used REAL)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+        self.connection.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT content, code, result, side_effects, created FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and now - row[4] > self.ttl:
+                self.connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+                self.connection.commit()
+                row = None
+            if row is None:
+                metrics.increment('cache_miss')
+                return None
+            self.connection.execute('UPDATE entries SET last_used = ? WHERE key = ?', (now, key))
+            self.connection.commit()
+        metrics.increment('cache_hit')
+        return {'content': row[0], 'code': row[1], 'result': row[2], 'side_effects': bool(row[3])}
+
+    def put(self, key, content, code, result):
+        now = time.time()
+        size = sum(len(value.encode('utf-8')) for value in (content, code or '', result or ''))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, content, code, result, int(has_side_effects(code)), size, now, now)
+            )
+            self.evict(now)
+            self.connection.commit()
+
+    def evict(self, now):
+        self.connection.execute('DELETE FROM entries WHERE created < ?', (now - self.ttl,))
+        count, total = self.connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        while count > self.max_entries or total > self.max_bytes:
+            key, size = self.connection.execute(
+                'SELECT key, size FROM entries ORDER BY last_used LIMIT 1'
+            ).fetchone()
+            self.connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+            count -= 1
+            total -= size
+
+    def stats(self):
+        with self.lock:
+            entries, total = self.connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+            ).fetchone()
+        hits = metrics.counter('cache_hit')
+        misses = metrics.counter('cache_miss')
+        lookups = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'bytes': total
+        }
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM entries')
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,75 @@
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import threading
+import time
+import metrics
+
+
+class RequestScheduler:
+    def __init__(self, max_concurrent=2):
+        self.max_concurrent = max_concurrent
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='request')
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='scheduler', daemon=True)
+        self.thread.start()
+        self.semaphore = None
+        self.conversation_locks = {}
+        self.lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.wait_times = collections.deque(maxlen=100)
+
+    def submit(self, conversation_id, func, *args, **kwargs):
+        # Calls with the same conversation_id run one at a time in submission
+        # order; only calls for different conversations run concurrently.
+        with self.lock:
+            self.queued += 1
+        call = functools.partial(func, *args, **kwargs)
+        return asyncio.run_coroutine_threadsafe(
+            self.run(conversation_id, time.perf_counter(), call),
+            self.loop
+        )
+
+    async def run(self, conversation_id, enqueued, call):
+        # Both primitives are created lazily on the loop thread. asyncio.Lock
+        # wakes waiters in FIFO order, which keeps each conversation's
+        # messages in submission order while other conversations proceed.
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        lock = self.conversation_locks.setdefault(conversation_id, asyncio.Lock())
+        started = False
+        try:
+            async with lock:
+                async with self.semaphore:
+                    started = True
+                    wait = time.perf_counter() - enqueued
+                    with self.lock:
+                        self.queued -= 1
+                        self.running += 1
+                        self.wait_times.append(wait)
+                    metrics.record('queue_wait', wait=wait)
+                    try:
+                        return await self.loop.run_in_executor(self.executor, call)
+                    finally:
+                        with self.lock:
+                            self.running -= 1
+        finally:
+            if not started:
+                with self.lock:
+                    self.queued -= 1
+
+    def stats(self):
+        with self.lock:
+            waits = list(self.wait_times)
+            return {
+                'queued': self.queued,
+                'running': self.running,
+                'average_wait': sum(waits) / len(waits) if waits else 0.0,
+                'last_wait': waits[-1] if waits else 0.0
+            }
+
+    def shutdown(self, wait=False):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.shutdown(wait=wait)
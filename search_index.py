@@ -0,0 +1,188 @@
+import functools
+import re
+import sqlite3
+import threading
+import unicodedata
+import metrics
+
+
+WORD = re.compile(r'\w+')
+CYRILLIC = re.compile('[а-я]')
+
+# Light suffix stripping per language, longest suffix first. It only has to
+# map the forms of a word to one key; the keys need not be real words.
+SUFFIXES = {
+    'en': ('ingly', 'edly', 'ness', 'ment', 'ings', 'ing', 'ies', 'ied', 'ed', 'es', 'ly', 's', 'e', 'y'),
+    'de': ('ungen', 'heiten', 'keiten', 'ung', 'heit', 'keit', 'isch', 'lich', 'ern', 'em', 'en', 'er', 'es',
+           'e', 's', 'n'),
+    'ru': ('иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ать', 'ять', 'ить', 'еть', 'ешь',
+           'ете', 'ите', 'ает', 'яет', 'ует', 'ют', 'ут', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ой', 'ей', 'ий',
+           'ый', 'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ию', 'ья', 'ье', 'ью', 'ы', 'и', 'а', 'я', 'о',
+           'е', 'у', 'ю', 'ь', 'й')
+}
+SUFFIXES = {language: sorted(suffixes, key=len, reverse=True) for language, suffixes in SUFFIXES.items()}
+MIN_STEM = 3
+BATCH_SIZE = 1000
+
+
+def word_language(word, language):
+    # Cyrillic words are Russian whatever language the message was sent in;
+    # Latin ones follow the message language, falling back to English.
+    if CYRILLIC.search(word):
+        return 'ru'
+    return language if language in ('en', 'de') else 'en'
+
+
+@functools.lru_cache(maxsize=65536)
+def stem(word, language):
+    if language == 'ru' and word.endswith(('ся', 'сь')) and len(word) - 2 >= MIN_STEM:
+        word = word[:-2]
+    if not word.isalpha():
+        return word
+    for suffix in SUFFIXES[language]:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            word = word[:-len(suffix)]
+            if language == 'en' and suffix in ('ing', 'ed') and word[-1] == word[-2] and word[-1] not in 'aeiouls':
+                # running -> runn -> run
+                word = word[:-1]
+            break
+    return word
+
+
+def terms(text, language):
+    text = unicodedata.normalize('NFKC', text).casefold().replace('ё', 'е')
+    return [stem(word, word_language(word, language)) for word in WORD.findall(text)]
+
+
+def record_text(record):
+    return '\n'.join(part for part in (record.get('content'), record.get('result')) if part)
+
+
+def snippet(text, query_terms, language, width=120):
+    # The window of text around the first word that matches the query.
+    start = 0
+    folded = unicodedata.normalize('NFKC', text).casefold().replace('ё', 'е')
+    if len(folded) == len(text):
+        for match in WORD.finditer(folded):
+            word = stem(match.group(), word_language(match.group(), language))
+            if any(word.startswith(term) for term in query_terms):
+                start = max(0, match.start() - width // 3)
+                break
+    text = ' '.join(text[start:start + width * 2].split())[:width]
+    return ('…' if start else '') + text
+
+
+class SearchIndex:
+    def __init__(self, history, path='history_index.sqlite3'):
+        self.history = history
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS entries USING fts5('
+            'terms, role UNINDEXED, timestamp UNINDEXED, record_end UNINDEXED, '
+            'tokenize="unicode61 remove_diacritics 2")'
+        )
+        self.connection.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)')
+        self.connection.commit()
+        row = self.connection.execute("SELECT value FROM state WHERE key = 'position'").fetchone()
+        self.position = row[0] if row else 0
+        # Bumped by clear() and close() so a sync running on another thread
+        # stops instead of writing records from before.
+        self.generation = 0
+
+    def row(self, record):
+        # The record's byte offset in the history file is its rowid, so
+        # indexing the same record twice replaces it.
+        text = ' '.join(terms(record_text(record), record.get('language') or 'en'))
+        return (record['offset'], text, record.get('role'), record.get('timestamp'), record.get('end'))
+
+    def write(self, rows, position):
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO entries (rowid, terms, role, timestamp, record_end) VALUES (?, ?, ?, ?, ?)', rows
+        )
+        if position > self.position:
+            self.position = position
+            self.connection.execute("INSERT OR REPLACE INTO state VALUES ('position', ?)", (position,))
+        self.connection.commit()
+
+    def add(self, record):
+        if record.get('offset') is None or record.get('end') is None:
+            return
+        row = self.row(record)
+        with self.lock:
+            # A record past the indexed position is picked up by sync() too;
+            # moving the position over it would skip the ones before it.
+            position = record['end'] if record['offset'] == self.position else self.position
+            self.write([row], position)
+        metrics.increment('search_indexed')
+
+    def sync(self):
+        # Catches up on records appended since the last run; a history file
+        # shorter than the indexed position was cleared or replaced.
+        if self.history.size() < self.position:
+            self.clear()
+        generation = self.generation
+        rows = []
+        end = self.position
+        for record in self.history.iter_records(self.position):
+            rows.append(self.row(record))
+            end = record['end']
+            if len(rows) == BATCH_SIZE:
+                if not self.write_batch(rows, end, generation):
+                    return
+                rows = []
+        self.write_batch(rows, end, generation)
+
+    def write_batch(self, rows, position, generation):
+        with self.lock:
+            if generation != self.generation:
+                return False
+            self.write(rows, position)
+        return True
+
+    def search(self, query, language='en', limit=50):
+        query_terms = list(dict.fromkeys(term for term in terms(query, language)))
+        if not query_terms:
+            return []
+        # Every term has to appear. Exact matches come first; prefix matches
+        # then find words stemmed differently from the query.
+        rows = []
+        seen = set()
+        for suffix in ('', '*'):
+            expression = ' '.join(f'"{term}"{suffix}' for term in query_terms)
+            with self.lock:
+                matches = self.connection.execute(
+                    'SELECT rowid, role, timestamp, record_end FROM entries WHERE entries MATCH ? '
+                    'ORDER BY rank LIMIT ?',
+                    (expression, limit + len(rows))
+                ).fetchall()
+            for row in matches:
+                if row[0] not in seen and len(rows) < limit:
+                    seen.add(row[0])
+                    rows.append(row)
+            if len(rows) == limit:
+                break
+        metrics.increment('search_query')
+        results = []
+        for offset, role, timestamp, end in rows:
+            record = self.history.read_at(offset)
+            if record is None:
+                continue
+            record.update(offset=offset, end=end, role=role, timestamp=timestamp)
+            record['snippet'] = snippet(record_text(record), query_terms, language)
+            results.append(record)
+        return results
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM entries')
+            self.connection.execute('DELETE FROM state')
+            self.connection.commit()
+            self.position = 0
+            self.generation += 1
+
+    def close(self):
+        with self.lock:
+            self.generation += 1
+            self.connection.close()
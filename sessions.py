@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from history import HistoryStore
+
+
+DEFAULT_SESSION = 'default'
+TITLE_LENGTH = 40
+
+
+def make_title(text):
+    text = ' '.join(text.split())
+    return text if len(text) <= TITLE_LENGTH else text[:TITLE_LENGTH - 1].rstrip() + '…'
+
+
+class SessionStore:
+    # Session metadata lives in one small table, so listing sessions never
+    # touches their history files.
+    COLUMNS = ('id', 'title', 'path', 'index_path', 'created', 'last_used', 'message_count')
+
+    def __init__(self, path='sessions.sqlite3', directory='sessions', legacy_path='chat_history.jsonl',
+                 legacy_index_path='history_index.sqlite3'):
+        self.path = path
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'id TEXT PRIMARY KEY, title TEXT, path TEXT, index_path TEXT, created REAL, last_used REAL, '
+            'message_count INTEGER)'
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)')
+        self.connection.commit()
+        if self.get(DEFAULT_SESSION) is None:
+            self.import_legacy(legacy_path, legacy_index_path)
+
+    def import_legacy(self, legacy_path, legacy_index_path):
+        # The single history from before sessions existed becomes the default
+        # session where it is, so its search index stays valid.
+        history = HistoryStore(legacy_path)
+        title = ''
+        count = 0
+        for record in history.iter_records():
+            count += 1
+            if not title and record.get('role') in ('user', 'legacy'):
+                title = make_title(record.get('content') or '')
+        history.close()
+        now = time.time()
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR IGNORE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (DEFAULT_SESSION, title, legacy_path, legacy_index_path, now, now, count)
+            )
+            self.connection.commit()
+
+    def row_to_session(self, row):
+        return dict(zip(self.COLUMNS, row)) if row is not None else None
+
+    def list(self):
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM sessions ORDER BY last_used DESC"
+            ).fetchall()
+        return [self.row_to_session(row) for row in rows]
+
+    def get(self, session_id):
+        with self.lock:
+            row = self.connection.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        return self.row_to_session(row)
+
+    def create(self, title=''):
+        os.makedirs(self.directory, exist_ok=True)
+        session_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        session = {
+            'id': session_id,
+            'title': title,
+            'path': os.path.join(self.directory, f'{session_id}.jsonl'),
+            'index_path': os.path.join(self.directory, f'{session_id}.index.sqlite3'),
+            'created': now,
+            'last_used': now,
+            'message_count': 0
+        }
+        with self.lock:
+            self.connection.execute(
+                'INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?)', tuple(session[name] for name in self.COLUMNS)
+            )
+            self.connection.commit()
+        return session
+
+    def touch(self, session_id, added=0):
+        with self.lock:
+            self.connection.execute(
+                'UPDATE sessions SET last_used = ?, message_count = message_count + ? WHERE id = ?',
+                (time.time(), added, session_id)
+            )
+            self.connection.commit()
+
+    def rename(self, session_id, title):
+        with self.lock:
+            self.connection.execute('UPDATE sessions SET title = ? WHERE id = ?', (title, session_id))
+            self.connection.commit()
+
+    def reset(self, session_id):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE sessions SET title = '', message_count = 0, last_used = ? WHERE id = ?",
+                (time.time(), session_id)
+            )
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,153 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+SCHEMA_VERSION = 1
+
+# Known settings with their default values. A stored value of the wrong type
+# is ignored in favour of the default instead of breaking the caller.
+DEFAULTS = {
+    'language': 'en',
+    'dark_mode': True,
+    'theme': 'default',
+    'session': 'default',
+    'pin_model': False,
+    'keep_alive': '30m',
+    'warm_up': True,
+    'backend': 'ollama',
+    'model': 'gemma3:1b',
+    'context_tokens': 2048,
+    'context_strategy': 'truncate',
+    'response_cache': False,
+    'max_concurrent_requests': 2,
+    'repair_attempts': 2,
+    'repair_time_budget': 60,
+    'tracing': True,
+    'trace_file': 'trace.json'
+}
+
+TYPES = {
+    'keep_alive': (str, int),
+    'repair_time_budget': (int, float)
+}
+
+
+def migrate(data):
+    # Version 0 is the unversioned file written before the store existed;
+    # its keys carry over unchanged.
+    if data.get('schema_version', 0) < 1:
+        data['schema_version'] = 1
+    return data
+
+
+def check_type(key, value):
+    if key not in DEFAULTS:
+        return True
+    if isinstance(value, bool) and not isinstance(DEFAULTS[key], bool):
+        return False
+    return isinstance(value, TYPES.get(key, type(DEFAULTS[key])))
+
+
+class SettingsStore:
+    def __init__(self, path='settings.json', delay=0.5):
+        self.path = path
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.timer = None
+        self.dirty = False
+        self.data = self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError("settings must be a JSON object")
+        except FileNotFoundError:
+            return {'schema_version': SCHEMA_VERSION}
+        except (OSError, ValueError) as e:
+            backup = f"{self.path}.corrupt-{time.strftime('%Y%m%d-%H%M%S')}"
+            try:
+                os.replace(self.path, backup)
+                print(f"Settings file {self.path} is unreadable ({e}); moved it to {backup}")
+            except OSError:
+                print(f"Settings file {self.path} is unreadable ({e})")
+            return {'schema_version': SCHEMA_VERSION}
+        return migrate(data)
+
+    def get(self, key, default=None):
+        with self.lock:
+            value = self.data.get(key)
+        if value is not None and check_type(key, value):
+            return value
+        if default is not None:
+            return default
+        return DEFAULTS.get(key)
+
+    def set(self, key, value):
+        if not check_type(key, value):
+            raise TypeError(f"setting {key} must be {type(DEFAULTS[key]).__name__}, got {type(value).__name__}")
+        with self.lock:
+            if key in self.data and self.data[key] == value:
+                return False
+            self.data[key] = value
+            self.dirty = True
+        self.schedule_save()
+        return True
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.data
+
+    def schedule_save(self):
+        # Changes arriving within `delay` seconds are written together, on
+        # the timer's thread rather than the caller's.
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.save)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with self.write_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                snapshot = json.dumps(self.data, ensure_ascii=False, indent=4)
+                self.dirty = False
+            temp_path = None
+            try:
+                fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.settings-', suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(snapshot)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                print(f"Error saving settings: {e}")
+                with self.lock:
+                    self.dirty = True
+                if temp_path is not None and os.path.exists(temp_path):
+                    os.unlink(temp_path)
+
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        self.save()
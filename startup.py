@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+import time
+
+
+PROFILE_ENV = 'DAVE_PROFILE_STARTUP'
+IMPORTTIME_LOG = 'startup_importtime.log'
+TARGET_MS = 500
+
+_start = time.perf_counter()
+_phases = []
+
+
+def enabled():
+    return bool(os.environ.get(PROFILE_ENV))
+
+
+def profile_imports():
+    # -X importtime only works from the interpreter's command line, so the
+    # app runs itself once more with it and its stderr goes to a log file.
+    if not enabled() or 'importtime' in sys._xoptions:
+        return
+    with open(IMPORTTIME_LOG, 'w', encoding='utf-8') as log:
+        code = subprocess.call([sys.executable, '-X', 'importtime'] + sys.argv, stderr=log)
+    sys.exit(code)
+
+
+def mark(phase):
+    _phases.append((phase, time.perf_counter()))
+
+
+def report():
+    if not enabled():
+        return
+    previous = _start
+    for phase, moment in _phases:
+        print(f"startup {phase:<12} {(moment - previous) * 1000:8.1f} ms")
+        previous = moment
+    total = (previous - _start) * 1000
+    status = "over" if total > TARGET_MS else "within"
+    print(f"startup total        {total:8.1f} ms ({status} the {TARGET_MS} ms budget)")
+    if 'importtime' in sys._xoptions:
+        print(f"Import times are in {IMPORTTIME_LOG}")
@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_ollama import MockOllamaServer
+
+
+SNIPPETS = [
+    'print("Hello! I am Dave.")',
+    'import os\nprint(os.path.join(os.path.expanduser("~"), "Desktop"))',
+    'print(sum(range(100000)))',
+]
+
+STARTUP_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+import main
+window = main.MainWindow()
+window.show()
+app.processEvents()
+print((time.perf_counter() - start) * 1000)
+window.close()
+'''
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'runs': len(timings),
+        'mean': statistics.mean(timings),
+        'p50': statistics.median(timings),
+        'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    }
+
+
+def bench_response(runs):
+    import code
+    code.get_ai_response("warm up", "en")
+    timings = []
+    for i in range(runs):
+        start = time.perf_counter()
+        code.get_ai_response(f"say hello {i}", "en")
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+
+def bench_execute(runs):
+    import code
+    import executor
+    # bench_response already started the pool; the cold call starts a new
+    # one, as the first snippet would without pre-starting.
+    with executor._pool_lock:
+        if executor._pool is not None:
+            executor._pool.shutdown()
+            executor._pool = None
+    start = time.perf_counter()
+    code.execute_code(SNIPPETS[0])
+    cold = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for i in range(runs):
+        code.execute_code(SNIPPETS[i % len(SNIPPETS)])
+    elapsed = time.perf_counter() - start
+    return {'runs': runs, 'per_second': runs / elapsed, 'mean': elapsed * 1000 / runs, 'cold': cold}
+
+
+def bench_history(sizes, runs):
+    from history import HistoryStore
+    from search_index import SearchIndex
+    results = {}
+    for size in sizes:
+        path = f'bench_history_{size}.jsonl'
+        store = HistoryStore(path=path, legacy_path=f'bench_history_{size}.txt')
+        start = time.perf_counter()
+        for i in range(size):
+            store.append('user' if i % 2 == 0 else 'assistant', f"message number {i} " * 4, language='en')
+        save = (time.perf_counter() - start) * 1000 / size
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            store.load_page(limit=100)
+            timings.append((time.perf_counter() - start) * 1000)
+        index = SearchIndex(store, path=f'bench_index_{size}.sqlite3')
+        start = time.perf_counter()
+        index.sync()
+        build = (time.perf_counter() - start) * 1000
+        search_timings = []
+        for i in range(runs):
+            start = time.perf_counter()
+            index.search(f"number {i * 37 % size}", 'en')
+            search_timings.append((time.perf_counter() - start) * 1000)
+        index.close()
+        store.close()
+        results[str(size)] = {
+            'save_per_record': save,
+            'load_page': summarize(timings)['p50'],
+            'index_build': build,
+            'search': summarize(search_timings)['p50']
+        }
+    return results
+
+
+def bench_startup(runs, env):
+    env = dict(env, QT_QPA_PLATFORM='offscreen')
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT.format(root=ROOT)],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return summarize(timings)
+
+
+def flatten(results):
+    # Only "lower is better" numbers take part in baseline comparisons.
+    values = {
+        'response.p50': results['response']['p50'],
+        'execute.mean': results['execute']['mean'],
+        'execute.cold': results['execute'].get('cold'),
+        'startup.p50': results['startup']['p50']
+    }
+    for size, result in results['history'].items():
+        values[f'history.{size}.save_per_record'] = result['save_per_record']
+        values[f'history.{size}.load_page'] = result['load_page']
+        if 'search' in result:
+            values[f'history.{size}.search'] = result['search']
+    return values
+
+
+def compare(results, baseline, tolerance):
+    current = flatten(results)
+    previous = flatten(baseline)
+    regressions = []
+    for name, value in current.items():
+        old = previous.get(name)
+        if old and value > old * (1 + tolerance):
+            regressions.append(f"{name}: {old:.2f} -> {value:.2f} ms (+{(value / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def report(results):
+    response = results['response']
+    print(f"get_ai_response  p50 {response['p50']:8.2f} ms   p95 {response['p95']:8.2f} ms")
+    execute = results['execute']
+    print(f"execute_code     {execute['per_second']:8.1f} runs/s   mean {execute['mean']:8.2f} ms   "
+          f"cold {execute['cold']:8.2f} ms")
+    for size, result in results['history'].items():
+        print(f"history {size:>7}  save {result['save_per_record'] * 1000:8.2f} us/record   "
+              f"load page {result['load_page']:8.2f} ms   search {result['search']:8.2f} ms   "
+              f"index build {result['index_build'] / 1000:6.2f} s")
+    startup = results['startup']
+    print(f"startup          p50 {startup['p50']:8.2f} ms   p95 {startup['p95']:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Dave against a local mock of the Ollama API")
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--startup-runs', type=int, default=3)
+    parser.add_argument('--history-sizes', default='1000,10000,50000')
+    parser.add_argument('--token-rate', type=float, default=200.0, help="mock tokens per second")
+    parser.add_argument('--first-token-delay', type=float, default=0.05, help="mock seconds before the first token")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="compare with results previously written by --output")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    server = MockOllamaServer(token_rate=args.token_rate, first_token_delay=args.first_token_delay).start()
+    os.environ['OLLAMA_HOST'] = server.url
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix='dave-bench-'))
+
+    try:
+        import tracing
+        tracing.configure(enabled=False)
+        results = {
+            'response': bench_response(args.runs),
+            'execute': bench_execute(args.runs * 5),
+            'history': bench_history([int(size) for size in args.history_sizes.split(',')], args.runs),
+            'startup': bench_startup(args.startup_runs, os.environ)
+        }
+    finally:
+        server.stop()
+
+    report(results)
+    if args.output:
+        with open(os.path.join(cwd, args.output), 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(os.path.join(cwd, args.baseline)) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import code
+import executor
+import tracing
+
+
+SNIPPETS = [
+    'print("Hello! I am Dave.")',
+    'import os\nprint(os.path.join(os.path.expanduser("~"), "Desktop"))',
+    'import os\nprint(len(os.listdir(os.path.expanduser("~"))))',
+]
+
+
+def measure(run, runs):
+    timings = []
+    for i in range(runs):
+        snippet = SNIPPETS[i % len(SNIPPETS)]
+        start = time.perf_counter()
+        run(snippet)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name:<12} mean {statistics.mean(timings):8.2f} ms   "
+          f"p50 {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-snippet latency of the executor pool and spawn-per-call")
+    parser.add_argument('--runs', type=int, default=30)
+    args = parser.parse_args()
+    tracing.configure(enabled=False)
+
+    # Cold: the first snippet right after the pool is created, with its
+    # workers still importing. Pre-started: the first snippet once they are ready.
+    start = time.perf_counter()
+    pool = executor.ExecutorPool()
+    try:
+        pool.run(SNIPPETS[0])
+        cold = [(time.perf_counter() - start) * 1000]
+    finally:
+        pool.shutdown()
+
+    pool = executor.ExecutorPool()
+    try:
+        time.sleep(1)
+        prestarted = measure(lambda snippet: code.format_execution_result(*pool.run(snippet)), 1)
+        spawn = measure(code.execute_code_subprocess, args.runs)
+        pooled = measure(lambda snippet: code.format_execution_result(*pool.run(snippet)), args.runs)
+    finally:
+        pool.shutdown()
+
+    report("spawn", spawn)
+    report("pool cold", cold)
+    report("pool ready", prestarted)
+    report("pool", pooled)
+    print(f"speedup      {statistics.median(spawn) / statistics.median(pooled):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from translations import Translations
+
+
+KEYS = ['Send', 'You', 'Dave', 'Error', 'Clear History', 'Language', 'Missing key']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure translation startup and lookup cost")
+    parser.add_argument('--lookups', type=int, default=200000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    translations = Translations()
+    created = time.perf_counter() - start
+
+    timings = {}
+    for language in translations.languages:
+        start = time.perf_counter()
+        translations.set_language(language)
+        timings[language] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(args.lookups):
+        translations.get_translation('ru', KEYS[i % len(KEYS)])
+    lookup = (time.perf_counter() - start) / args.lookups
+
+    print(f"startup       {created * 1000:8.3f} ms")
+    for language, elapsed in timings.items():
+        print(f"compile {language:<5} {elapsed * 1000:8.3f} ms")
+    print(f"lookup        {lookup * 1e9:8.1f} ns")
+
+
+if __name__ == '__main__':
+    main()
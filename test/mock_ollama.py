@@ -0,0 +1,204 @@
+import argparse
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_RESPONSE = '<python>\nprint("Hello! I am Dave, your assistant. How can I help you?")\n</python>'
+
+
+def tokenize(text):
+    tokens = []
+    start = 0
+    for index, char in enumerate(text):
+        if char in ' \n':
+            tokens.append(text[start:index + 1])
+            start = index + 1
+    if start < len(text):
+        tokens.append(text[start:])
+    return tokens
+
+
+class MockOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_stream(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def send_chunk(self, data):
+        line = (json.dumps(data) + '\n').encode('utf-8')
+        self.wfile.write(f'{len(line):x}\r\n'.encode('ascii') + line + b'\r\n')
+        self.wfile.flush()
+
+    def end_stream(self):
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def do_GET(self):
+        server = self.server
+        if self.path == '/api/tags':
+            self.send_json({'models': [{'name': name} for name in server.models]})
+        elif self.path == '/api/version':
+            self.send_json({'version': '0.0.0-mock'})
+        elif self.path == '/api/ps':
+            self.send_json({'models': []})
+        elif self.path == '/v1/models':
+            self.send_json({'object': 'list', 'data': [{'id': name, 'object': 'model'} for name in server.models]})
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        request = self.read_json()
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        if self.path in ('/api/chat', '/api/generate'):
+            self.generate(request, chat=self.path == '/api/chat')
+        elif self.path == '/v1/chat/completions':
+            self.openai_completion(request)
+        elif self.path == '/api/pull':
+            self.start_stream()
+            for completed in range(0, 101, 25):
+                self.send_chunk({'status': 'pulling', 'completed': completed, 'total': 100})
+            with server.lock:
+                if request.get('model') not in server.models:
+                    server.models.append(request.get('model'))
+            self.send_chunk({'status': 'success'})
+            self.end_stream()
+        else:
+            self.send_json({'error': 'not found'}, 404)
+
+    def generate(self, request, chat):
+        server = self.server
+        model = request.get('model', '')
+        prompt = request.get('prompt', '')
+        tokens = tokenize(server.response) if chat or prompt else []
+        start = time.perf_counter()
+        time.sleep(server.first_token_delay)
+        prompt_eval_duration = time.perf_counter() - start
+
+        def chunk(token, done=False):
+            data = {'model': model, 'created_at': '2024-01-01T00:00:00Z', 'done': done}
+            if chat:
+                data['message'] = {'role': 'assistant', 'content': token}
+            else:
+                data['response'] = token
+            if done:
+                data.update({
+                    'done_reason': 'stop',
+                    'total_duration': int((time.perf_counter() - start) * 1e9),
+                    'load_duration': 0,
+                    'prompt_eval_count': sum(len(message.get('content', '')) // 4 for message in request.get('messages', [])),
+                    'prompt_eval_duration': int(prompt_eval_duration * 1e9),
+                    'eval_count': len(tokens),
+                    'eval_duration': int((time.perf_counter() - start - prompt_eval_duration) * 1e9)
+                })
+            return data
+
+        if not request.get('stream', True):
+            time.sleep(len(tokens) / server.token_rate)
+            data = chunk(''.join(tokens), done=True)
+            self.send_json(data)
+            return
+
+        self.start_stream()
+        for index, token in enumerate(tokens):
+            if index:
+                time.sleep(1 / server.token_rate)
+            self.send_chunk(chunk(token))
+        self.send_chunk(chunk('', done=True))
+        self.end_stream()
+
+    def openai_completion(self, request):
+        server = self.server
+        tokens = tokenize(server.response)
+        time.sleep(server.first_token_delay)
+        if not request.get('stream'):
+            time.sleep(len(tokens) / server.token_rate)
+            self.send_json({'choices': [{'message': {'role': 'assistant', 'content': ''.join(tokens)}}]})
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for index, token in enumerate(tokens + [None]):
+            if index:
+                time.sleep(1 / server.token_rate)
+            data = '[DONE]' if token is None else json.dumps({'choices': [{'delta': {'content': token}}]})
+            line = f'data: {data}\n\n'.encode('utf-8')
+            self.wfile.write(f'{len(line):x}\r\n'.encode('ascii') + line + b'\r\n')
+            self.wfile.flush()
+        self.end_stream()
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, token_rate=100.0, first_token_delay=0.05,
+                 response=DEFAULT_RESPONSE, models=('gemma3:1b',)):
+        super().__init__((host, port), MockOllamaHandler)
+        self.token_rate = token_rate
+        self.first_token_delay = first_token_delay
+        self.response = response
+        self.models = list(models)
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def handle_error(self, request, client_address):
+        # Clients such as a closing window drop connections mid-stream.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Ollama HTTP API")
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--token-rate', type=float, default=100.0, help="tokens per second")
+    parser.add_argument('--first-token-delay', type=float, default=0.05, help="seconds before the first token")
+    args = parser.parse_args()
+
+    server = MockOllamaServer(port=args.port, token_rate=args.token_rate, first_token_delay=args.first_token_delay)
+    print(f"Mock Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
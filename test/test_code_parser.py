@@ -0,0 +1,144 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backends
+import code
+import tracing
+
+
+tracing.configure(enabled=False)
+
+
+def parse(chunks):
+    parser = code.CodeBlockParser()
+    blocks = []
+    for chunk in chunks:
+        blocks += parser.feed(chunk)
+    blocks += parser.finish()
+    return blocks
+
+
+def split_every(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class CodeBlockParserTest(unittest.TestCase):
+    def assertBlocks(self, text, expected):
+        # The same blocks have to come out however the response is chunked.
+        for size in (len(text) or 1, 1, 2, 3, 7):
+            with self.subTest(chunk_size=size):
+                self.assertEqual(parse(split_every(text, size)), expected)
+
+    def test_python_tag(self):
+        self.assertBlocks('Sure.\n<python>\nprint(1)\n</python>\nDone.', ['print(1)'])
+
+    def test_python_fences(self):
+        for tag in ('python', 'python3', 'py', 'Python'):
+            with self.subTest(tag=tag):
+                self.assertBlocks(f'Here:\n```{tag}\nprint(1)\n```\n', ['print(1)'])
+
+    def test_multiple_blocks(self):
+        text = (
+            '<python>\na = 1\n</python>\n'
+            '```python\nb = 2\n```\n'
+            'text between\n'
+            '```py\nc = 3\n```'
+        )
+        self.assertBlocks(text, ['a = 1', 'b = 2', 'c = 3'])
+
+    def test_other_languages_are_skipped(self):
+        text = (
+            '```bash\npip install requests\n```\n'
+            'Then run:\n'
+            '```python\nimport requests\n```\n'
+            '```json\n{"a": 1}\n```\n'
+        )
+        self.assertBlocks(text, ['import requests'])
+
+    def test_closing_fence_is_not_an_opener(self):
+        # The closer of the bash block is followed by prose, then by a python
+        # block; the prose must not be taken for code.
+        text = '```bash\nls\n```\nprint("not code")\n```python\nprint("code")\n```\n'
+        self.assertBlocks(text, ['print("code")'])
+
+    def test_bare_fence_is_skipped(self):
+        self.assertBlocks('Output:\n```\nHello\n```\n', [])
+
+    def test_python_tag_inside_other_fence_is_skipped(self):
+        self.assertBlocks('```text\n<python>\nprint(1)\n</python>\n```\n', [])
+
+    def test_indented_fence(self):
+        self.assertBlocks('1. Run:\n   ```python\n   print(1)\n   ```\n', ['print(1)'])
+
+    def test_unterminated_python_tag(self):
+        self.assertBlocks('<python>\nprint(1)\n', ['print(1)'])
+
+    def test_unterminated_fence(self):
+        self.assertBlocks('```python\nprint(1)\n', [])
+
+    def test_unterminated_opener(self):
+        self.assertBlocks('Text <pyth', [])
+        self.assertBlocks('Text\n```pyth', [])
+
+    def test_blocks_are_returned_as_they_close(self):
+        parser = code.CodeBlockParser()
+        self.assertEqual(parser.feed('<python>\nprint(1)\n</pyt'), [])
+        self.assertEqual(parser.feed('hon>\n```python\nprint(2)\n``'), ['print(1)'])
+        self.assertEqual(parser.feed('`\n'), ['print(2)'])
+        self.assertEqual(parser.finish(), [])
+        self.assertEqual(parser.blocks, ['print(1)', 'print(2)'])
+
+    def test_extract_code_blocks(self):
+        text = '```sh\necho hi\n```\n<python>\nprint(1)\n</python>'
+        self.assertEqual(code.extract_code_blocks(text), ['print(1)'])
+
+
+def reply(*texts):
+    def chat(messages, keep_alive=None):
+        for text in texts:
+            yield {'message': {'content': text}}
+        yield {'message': {'content': ''}, 'done': True}
+    return chat
+
+
+class BlockRunnerTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = backends.get_backend()
+        self.addCleanup(vars(self.backend).pop, 'chat', None)
+
+    def test_first_block_succeeds_second_fails(self):
+        runner = code.BlockRunner()
+        runner.submit('print("step 1 done")')
+        runner.submit('raise ValueError("boom")')
+        result = runner.result()
+        self.assertTrue(result.startswith('step 1 done\nError:'))
+        self.assertIn('ValueError: boom', result)
+        self.assertTrue(runner.failed.is_set())
+
+    def test_later_blocks_are_skipped_after_a_failure(self):
+        runner = code.BlockRunner()
+        runner.submit('raise ValueError("boom")')
+        runner.submit('print("not run")')
+        self.assertNotIn('not run', runner.result())
+
+    def test_partial_failure_is_repaired(self):
+        self.backend.chat = reply(
+            '<python>\nprint("step 1 done")\n</python>\n<python>\nraise ValueError("boom")\n</python>'
+        )
+        attempts = []
+
+        def on_attempt(attempt, content, result):
+            attempts.append(result)
+            self.backend.chat = reply('<python>\nprint("fixed")\n</python>')
+
+        content, result = code.stream_ai_response('do two steps', on_attempt=on_attempt)
+        self.assertEqual(len(attempts), 1)
+        self.assertIn('ValueError: boom', attempts[0])
+        self.assertEqual(result, 'fixed')
+
+
+if __name__ == '__main__':
+    unittest.main()
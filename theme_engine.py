@@ -0,0 +1,136 @@
+import json
+import os
+from PyQt5.QtCore import QObject, QFileSystemWatcher, pyqtSignal
+
+
+THEMES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'themes')
+DEFAULT_THEME = 'default'
+MODES = ('dark', 'light')
+
+TEMPLATE = """
+QWidget#container {{
+    background-color: {window_bg};
+    border: 1px solid {window_border};
+    border-radius: {window_radius};
+}}
+QTextEdit, QListView, QLineEdit, QComboBox {{
+    background-color: {input_bg};
+    color: {text_color};
+    border: 1px solid {border_color};
+    border-radius: {border_radius};
+}}
+QPushButton {{
+    background-color: {accent_color};
+    color: white;
+    border: none;
+    border-radius: {border_radius};
+}}
+QPushButton:hover {{
+    background-color: {accent_hover};
+}}
+QPushButton#closeButton {{
+    background-color: {close_color};
+}}
+QPushButton#closeButton:hover {{
+    background-color: {close_hover};
+}}
+QPushButton#minimizeButton {{
+    background-color: {minimize_color};
+}}
+QPushButton#minimizeButton:hover {{
+    background-color: {minimize_hover};
+}}
+QComboBox::drop-down {{
+    border: none;
+}}
+QComboBox::down-arrow {{
+    image: none;
+    border: none;
+}}
+"""
+
+
+class ThemeEngine(QObject):
+    changed = pyqtSignal(str)
+
+    def __init__(self, themes_dir=THEMES_DIR, parent=None):
+        super().__init__(parent)
+        self.themes_dir = themes_dir
+        self.themes = {}
+        self.stylesheets = {}
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.on_file_changed)
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+        if os.path.isdir(themes_dir):
+            self.watcher.addPath(themes_dir)
+        self.scan()
+
+    def names(self):
+        return sorted(self.themes)
+
+    def path(self, name):
+        return os.path.join(self.themes_dir, f'{name}.json')
+
+    def scan(self):
+        names = set()
+        if os.path.isdir(self.themes_dir):
+            names = {name[:-5] for name in os.listdir(self.themes_dir) if name.endswith('.json')}
+        for name in set(self.themes) - names:
+            self.forget(name)
+        for name in names - set(self.themes):
+            self.load(name)
+
+    def load(self, name):
+        path = self.path(name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                theme = json.load(f)
+        except (OSError, ValueError) as e:
+            # A file caught half-written keeps the theme it replaces.
+            print(f"Error loading theme {name}: {e}")
+            return False
+        self.themes[name] = theme
+        self.stylesheets = {key: sheet for key, sheet in self.stylesheets.items() if key[0] != name}
+        if path not in self.watcher.files():
+            self.watcher.addPath(path)
+        return True
+
+    def forget(self, name):
+        self.themes.pop(name, None)
+        self.stylesheets = {key: sheet for key, sheet in self.stylesheets.items() if key[0] != name}
+
+    def values(self, name, mode):
+        # Missing keys, or a missing mode, fall back to the default theme.
+        values = {}
+        for source in (self.themes.get(DEFAULT_THEME, {}), self.themes.get(name, {})):
+            values.update(source.get('dark', {}))
+            values.update(source.get(mode, {}))
+        return values
+
+    def stylesheet(self, name, mode):
+        key = (name if name in self.themes else DEFAULT_THEME, mode)
+        sheet = self.stylesheets.get(key)
+        if sheet is None:
+            try:
+                sheet = TEMPLATE.format_map(self.values(*key))
+            except KeyError as e:
+                print(f"Theme {key[0]} is missing {e}")
+                sheet = ''
+            self.stylesheets[key] = sheet
+        return sheet
+
+    def on_file_changed(self, path):
+        name = os.path.basename(path)[:-5]
+        if os.path.exists(path):
+            # Editors that save by replacing the file drop it from the watcher.
+            if self.load(name):
+                self.changed.emit(name)
+        else:
+            self.scan()
+            self.changed.emit(name)
+
+    def on_directory_changed(self, path):
+        before = set(self.themes)
+        self.scan()
+        if set(self.themes) != before:
+            self.changed.emit('')
@@ -0,0 +1,128 @@
+import atexit
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+class Tracer:
+    def __init__(self, path='trace.json', max_bytes=5 * 1024 * 1024, backups=2, enabled=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.file = None
+        self.size = 0
+        self.durations = collections.defaultdict(lambda: collections.deque(maxlen=500))
+        self.wall_origin = time.time()
+        self.perf_origin = time.perf_counter()
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter() - start, **args)
+
+    def add_span(self, name, start, duration, **args):
+        # `start` is a time.perf_counter() value and `duration` is in seconds.
+        with self.lock:
+            self.durations[name].append(duration)
+        if not self.enabled:
+            return
+        event = {
+            'name': name,
+            'cat': 'dave',
+            'ph': 'X',
+            'ts': round((self.wall_origin + start - self.perf_origin) * 1e6),
+            'dur': round(duration * 1e6),
+            'pid': os.getpid(),
+            'tid': threading.get_ident()
+        }
+        if args:
+            event['args'] = args
+        self.write(event)
+
+    def write(self, event):
+        # Chrome's trace viewer accepts the JSON array format without the
+        # closing bracket, so events can simply be appended.
+        line = json.dumps(event, ensure_ascii=False) + ',\n'
+        with self.lock:
+            if self.file is None or self.size >= self.max_bytes:
+                self.rotate()
+            self.file.write(line)
+            self.size += len(line)
+
+    def rotate(self):
+        if self.file is not None:
+            self.file.close()
+            for index in range(self.backups, 0, -1):
+                source = self.path if index == 1 else f'{self.path}.{index - 1}'
+                if os.path.exists(source):
+                    os.replace(source, f'{self.path}.{index}')
+        elif os.path.exists(self.path) and os.path.getsize(self.path) < self.max_bytes:
+            self.file = open(self.path, 'a', encoding='utf-8')
+            self.size = self.file.tell()
+            return
+        self.file = open(self.path, 'w', encoding='utf-8')
+        self.file.write('[\n')
+        self.size = 2
+
+    def summary(self):
+        result = {}
+        with self.lock:
+            items = [(name, sorted(values)) for name, values in self.durations.items() if values]
+        for name, values in items:
+            result[name] = {
+                'count': len(values),
+                'p50': values[len(values) // 2],
+                'p95': values[min(len(values) - 1, int(len(values) * 0.95))]
+            }
+        return result
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+# Off until configure() turns it on, so importing a module that records
+# spans (from a test or a benchmark) never writes a trace file.
+_tracer = Tracer(enabled=False)
+atexit.register(_tracer.close)
+
+
+def configure(path=None, enabled=True):
+    with _tracer.lock:
+        if path is not None and path != _tracer.path:
+            if _tracer.file is not None:
+                _tracer.file.close()
+                _tracer.file = None
+            _tracer.path = path
+        _tracer.enabled = enabled
+
+
+def span(name, **args):
+    return _tracer.span(name, **args)
+
+
+def add_span(name, start, duration, **args):
+    _tracer.add_span(name, start, duration, **args)
+
+
+def summary():
+    return _tracer.summary()
+
+
+def flush():
+    _tracer.flush()
@@ -1,83 +1,67 @@
-from PyQt5.QtCore import QTranslator
+import json
+import os
+import sys
+
+
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locales')
+FALLBACK_LANGUAGE = 'en'
 
 
 class Translations:
-    def __init__(self):
-        self.translations = {
-            'en': {
-                'Chat': 'Chat',
-                'Settings': 'Settings',
-                'Type your message here...': 'Type your message here...',
-                'Send': 'Send',
-                'Language': 'Language',
-                'Theme': 'Theme',
-                'Toggle Dark/Light Theme': 'Toggle Dark/Light Theme',
-                'You': 'You',
-                'Dave': 'Dave',
-                'Error': 'Error',
-                'Clear Chat': 'Clear Chat',
-                'Save Chat': 'Save Chat',
-                'Load Chat': 'Load Chat',
-                'Chat History': 'Chat History',
-                'Clear History': 'Clear History',
-                'Confirmation': 'Confirmation',
-                'Are you sure you want to clear chat history?': 'Are you sure you want to clear chat history?',
-                'Yes': 'Yes',
-                'No': 'No',
-                'Dark': 'Dark',
-                'Light': 'Light'
-            },
-            'ru': {
-                'Chat': 'Чат',
-                'Settings': 'Настройки',
-                'Type your message here...': 'Введите ваше сообщение...',
-                'Send': 'Отправить',
-                'Language': 'Язык',
-                'Theme': 'Тема',
-                'Toggle Dark/Light Theme': 'Переключить темную/светлую тему',
-                'You': 'Вы',
-                'Dave': 'Дейв',
-                'Error': 'Ошибка',
-                'Clear Chat': 'Очистить чат',
-                'Save Chat': 'Сохранить чат',
-                'Load Chat': 'Загрузить чат',
-                'Chat History': 'История чата',
-                'Clear History': 'Очистить историю',
-                'Confirmation': 'Подтверждение',
-                'Are you sure you want to clear chat history?': 'Вы уверены, что хотите очистить историю чата?',
-                'Yes': 'Да',
-                'No': 'Нет',
-                'Dark': 'Темный',
-                'Light': 'Светлый'
-            },
-            'de': {
-                'Chat': 'Chat',
-                'Settings': 'Einstellungen',
-                'Type your message here...': 'Geben Sie Ihre Nachricht ein...',
-                'Send': 'Senden',
-                'Language': 'Sprache',
-                'Theme': 'Design',
-                'Toggle Dark/Light Theme': 'Dunkles/Helles Design umschalten',
-                'You': 'Sie',
-                'Dave': 'Dave',
-                'Error': 'Fehler',
-                'Clear Chat': 'Chat löschen',
-                'Save Chat': 'Chat speichern',
-                'Load Chat': 'Chat laden',
-                'Chat History': 'Chat-Verlauf',
-                'Clear History': 'Geschichte löschen',
-                'Confirmation': 'Bestätigung',
-                'Are you sure you want to clear chat history?': 'Sind Sie sicher, dass Sie den Chat-Verlauf löschen möchten?',
-                'Yes': 'Ja',
-                'No': 'Nein',
-                'Dark': 'Dunkel',
-                'Light': 'Hell'
-            }
-        }
-        self.current_language = 'en'
-    
+    def __init__(self, locales_dir=LOCALES_DIR):
+        self.locales_dir = locales_dir
+        self.tables = {}
+        self.current_language = FALLBACK_LANGUAGE
+        self.languages = self.load_index()
+
+    def load_index(self):
+        try:
+            with open(os.path.join(self.locales_dir, 'languages.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {
+                name[:-5]: name[:-5]
+                for name in sorted(os.listdir(self.locales_dir))
+                if name.endswith('.json') and name != 'languages.json'
+            } if os.path.isdir(self.locales_dir) else {}
+
+    def load_catalogue(self, language):
+        try:
+            with open(os.path.join(self.locales_dir, f'{language}.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error loading translations for '{language}': {e}")
+            return {}
+
+    def compile(self, language):
+        # Flatten the fallback chain (requested -> en) into a single dict so
+        # every lookup is one hash probe; a key missing everywhere maps to itself.
+        table = {} if language == FALLBACK_LANGUAGE else dict(self.table(FALLBACK_LANGUAGE))
+        for key, value in self.load_catalogue(language).items():
+            table[sys.intern(key)] = sys.intern(value)
+        return table
+
+    def table(self, language):
+        table = self.tables.get(language)
+        if table is None:
+            table = self.tables[language] = self.compile(language)
+        return table
+
     def get_translation(self, language, key):
-        return self.translations.get(language, self.translations['en']).get(key, key)
-    
+        table = self.tables.get(language)
+        if table is None:
+            table = self.table(language)
+        return table.get(key, key)
+
+    def get_language_name(self, language):
+        return self.languages.get(language, self.languages.get(FALLBACK_LANGUAGE, language))
+
+    def get_language_code(self, name):
+        for language, language_name in self.languages.items():
+            if language_name == name:
+                return language
+        return FALLBACK_LANGUAGE
+
     def set_language(self, language):
-        self.current_language = language 
\ No newline at end of file
+        self.current_language = language
+        self.table(language)
@@ -6,6 +6,7 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                             QLabel, QComboBox, QFrame, QScrollArea)
 from PyQt5.QtCore import Qt, QPoint, QSize
 from PyQt5.QtGui import QColor, QPainter, QPainterPath, QFont
+from theme_engine import ThemeEngine
 
 class CustomTitleBar(QWidget):
     def __init__(self, parent):
@@ -86,56 +87,12 @@ class RoundedFrame(QFrame):
             }
         """)
 
-class ThemeManager:
-    def __init__(self):
-        self.themes = {}
-        self.current_theme = "default"
-        self.load_themes()
-    
-    def load_themes(self):
-        themes_dir = "themes"
-        if not os.path.exists(themes_dir):
-            os.makedirs(themes_dir)
-            self.create_default_themes()
-        
-        for theme_file in os.listdir(themes_dir):
-            if theme_file.endswith('.json'):
-                with open(os.path.join(themes_dir, theme_file), 'r', encoding='utf-8') as f:
-                    theme_name = theme_file[:-5]
-                    self.themes[theme_name] = json.load(f)
-    
-    def create_default_themes(self):
-        default_theme = {
-            "light": {
-                "window_bg": "#ffffff",
-                "title_bar_bg": "#f0f0f0",
-                "text_color": "#000000",
-                "accent_color": "#007acc",
-                "border_radius": "10px"
-            },
-            "dark": {
-                "window_bg": "#2b2b2b",
-                "title_bar_bg": "#1e1e1e",
-                "text_color": "#ffffff",
-                "accent_color": "#007acc",
-                "border_radius": "10px"
-            }
-        }
-        
-        with open("themes/default.json", 'w', encoding='utf-8') as f:
-            json.dump(default_theme, f, indent=4)
-    
-    def get_theme(self, theme_name, mode="dark"):
-        if theme_name in self.themes:
-            return self.themes[theme_name].get(mode, self.themes[theme_name]["dark"])
-        return self.themes["default"][mode]
-
 class RoundedWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowFlags(Qt.FramelessWindowHint)
         self.setAttribute(Qt.WA_TranslucentBackground)
-        self.theme_manager = ThemeManager()
+        self.theme_engine = ThemeEngine(parent=self)
         
         self.central_widget = QWidget()
         self.setCentralWidget(self.central_widget)
@@ -169,7 +126,7 @@ class RoundedWindow(QMainWindow):
         
         theme_label = QLabel("Тема:")
         self.theme_combo = QComboBox()
-        self.theme_combo.addItems(self.theme_manager.themes.keys())
+        self.theme_combo.addItems(self.theme_engine.names())
         self.theme_combo.currentTextChanged.connect(self.change_theme)
         
         self.mode_combo = QComboBox()
@@ -230,47 +187,7 @@ class RoundedWindow(QMainWindow):
         self.apply_theme(self.theme_combo.currentText(), "dark" if mode == "Темный" else "light")
     
     def apply_theme(self, theme_name, mode):
-        theme = self.theme_manager.get_theme(theme_name, mode)
-        
-        self.setStyleSheet(f"""
-            QMainWindow {{
-                background-color: transparent;
-            }}
-            #container {{
-                background-color: {theme['window_bg']};
-                border-radius: 10px;
-            }}
-            QWidget {{
-                color: {theme['text_color']};
-            }}
-            QTextEdit, QLineEdit {{
-                background-color: {theme['window_bg']};
-                color: {theme['text_color']};
-                border: 1px solid {theme['accent_color']};
-                border-radius: {theme['border_radius']};
-                padding: 5px;
-            }}
-            QPushButton {{
-                background-color: {theme['accent_color']};
-                color: white;
-                border: none;
-                border-radius: {theme['border_radius']};
-                padding: 5px 15px;
-            }}
-            QPushButton:hover {{
-                background-color: {theme['accent_color']}dd;
-            }}
-            #closeButton {{
-                background-color: transparent;
-                color: {theme['text_color']};
-                font-size: 20px;
-                font-weight: bold;
-            }}
-            #closeButton:hover {{
-                background-color: #e81123;
-                color: white;
-            }}
-        """)
+        self.setStyleSheet(self.theme_engine.stylesheet(theme_name, mode))
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)